@@ -3,6 +3,7 @@ import logging
 import sys
 import signal
 from acp.hexapod import Hexapod
+from acp.realtime import RealtimeMode
 from acp.servo import Servo
 from acp.controller_xbox import XboxOneController
 from acp.controller_network import NetworkController
@@ -44,21 +45,43 @@ class AcpRobot(Hexapod):
     HEAD_ROTATE_CAL = [107, 0] # min, max
 
     PCA_FREQ = 50 # Servo control freq
+    SERVO_RATE_HZ = PCA_FREQ # one servo output per PWM period
 
     CONTROLLERS = {
         "xbox": XboxOneController,
         "network": NetworkController
     }
 
+    # Left stick drives the head while walking, so the walking speed
+    # axis is the trackpad where the controller has one.
+    SPEED_AXES = {
+        "xbox": None,
+        "network": "pad_y"
+    }
+
     def __init__(self, config_file_path: str,
             controller: str = "xbox", 
             debug_servo: bool = False, 
-            debug_led: bool = False):
-        super().__init__(config_file_path)
+            debug_led: bool = False,
+            ik_backend: str = "analytic",
+            ik_cache_size: int = 0,
+            ik_cache_resolution: float = 0.1,
+            lookahead: int = 0,
+            realtime: RealtimeMode = None,
+            input_rate_hz: float = None,
+            kinematics_rate_hz: float = None,
+            servo_rate_hz: float = None,
+            clip_cache_dir: str = None):
+        super().__init__(config_file_path, ik_backend=ik_backend,
+                         ik_cache_size=ik_cache_size, ik_cache_resolution=ik_cache_resolution,
+                         lookahead=lookahead, realtime=realtime,
+                         input_rate_hz=input_rate_hz, kinematics_rate_hz=kinematics_rate_hz,
+                         servo_rate_hz=servo_rate_hz, clip_cache_dir=clip_cache_dir)
         set_disposition()
         
         if controller in self.CONTROLLERS:
             self.controller = self.CONTROLLERS.get(controller)()
+            self.AS_SPEED = self.SPEED_AXES.get(controller)
         elif controller is None:
             logger.warning("No controller provided")
         else:
@@ -72,6 +95,7 @@ class AcpRobot(Hexapod):
         else:
             self.head_tilt = DummyServo()
             self.head_rotate = DummyServo()
+            self.all_servos: List[Servo] = []
         if not debug_led:
             if not LED_IMPORT_OK:
                 logger.error("Unable to load RPi/led libs. You can still use app with dummy led, by using --debug-led")
@@ -81,7 +105,6 @@ class AcpRobot(Hexapod):
         else:
             self.led1 = DummyLed(1)
             self.led2 = DummyLed(2)
-        self.all_servos = []
         
 
     def _init_servo(self):
@@ -109,6 +132,7 @@ class AcpRobot(Hexapod):
         self.coxa6_servo  = Servo(ada_servo.Servo(self.pca1.channels[0]))
         self.femur6_servo = Servo(ada_servo.Servo(self.pca1.channels[1]), reverse=True)
         self.tibia6_servo = Servo(ada_servo.Servo(self.pca1.channels[2]), reverse=True)
+        self.collect_leg_servos()
 
 
         self.head_tilt = Servo(ada_servo.Servo(self.pca2.channels[13]), reverse=True)
@@ -139,37 +163,49 @@ class AcpRobot(Hexapod):
             ]
 
     
+    def release_servos(self):
+        # servos go limp before the PCA outputs are shut down
+        for servo in self.all_servos:
+            servo.release()
+        if not self.debug_servo:
+            self.pca1.deinit()
+            self.pca2.deinit()
+
     def loop(self):
         if rconf.sigint:
             logger.info("CTRL+C. Terminating")
+            logger.info("Loop rates: %s", self.rate_report())
+            logger.info("Loop profile:\n%s", self.profiler.report())
             self.led1.off()
             self.led2.off()
-            if not self.debug_servo:
-                for servo in self.all_servos:
-                    servo.angle = None
-                self.pca1.deinit()
-                self.pca2.deinit()
+            self.release_servos()
             # Yeah... I know, but thrift thread doesn't have stop method
             os.kill(os.getpid(), 9)
+        if rconf.dump_profile:
+            rconf.dump_profile = False
+            logger.info("Loop profile:\n%s", self.profiler.report())
 
         super().loop()
 
-
-        current_state.mode = self.mode
-        if current_state.mode == Mode.WALK:
-            current_state.sub_mode = self.gait
-        else:
-            current_state.mode == 0
-        current_state.speed = self.gait_speed
-        current_state.light_1 = self.led1.state
-        current_state.light_2 = self.led2.state
-        current_state.battery = 100
-
-
-        if self.mode == self.MODE_WALK:
-            self.control_head()
-        else:
-            self.default_head()
+        profile = self.profiler
+        with profile.stage("state"):
+            current_state.mode = self.mode
+            if current_state.mode == Mode.WALK:
+                current_state.sub_mode = self.gait
+            else:
+                current_state.mode == 0
+            current_state.speed = self.gait_speed
+            current_state.light_1 = self.led1.state
+            current_state.light_2 = self.led2.state
+            current_state.battery = 100
+
+    def flush_servos(self):
+        super().flush_servos()
+        with self.profiler.stage("head"):
+            if self.mode == self.MODE_WALK:
+                self.control_head()
+            else:
+                self.default_head()
 
 
     def process_gamepad(self):
@@ -0,0 +1,403 @@
+#***********************************************************************
+# Kinematics benchmarks
+# Reproducible throughput and accuracy numbers for judging speed work
+# on the kinematics. Run from the acp directory:
+#   python benchmark.py ik
+#   python benchmark.py ik-loop
+#   python benchmark.py gait
+#   python benchmark.py golden [--update]
+#   python benchmark.py schedule
+#   python benchmark.py alloc
+# The documented accuracy bounds of the IK backends are enforced by
+# tests/test_kinematics.py and the alloc budgets by tests/test_alloc.py
+# (python -m pytest tests from the repo root).
+#***********************************************************************
+import gc
+import os
+import sys
+import time
+import logging
+import tracemalloc
+from typing import Dict, List, Tuple
+
+import click
+import numpy as np
+
+import kinematics
+from hexapod import Hexapod
+from ik_cache import CachedIK
+from dummy import ScriptedController
+
+logger = logging.getLogger(__name__)
+
+
+def workspace_sweep(samples: int, seed: int = 0) -> np.ndarray:
+    """(samples, 6, 3) targets within +-60 mm X/Y of home and Z in [-170, 30] mm."""
+    rng = np.random.default_rng(seed)
+    home = np.array([Hexapod.HOME_X, Hexapod.HOME_Y, Hexapod.HOME_Z]).T
+    targets = np.repeat(home[None], samples, axis=0)
+    targets[..., 0:2] += rng.uniform(-60.0, 60.0, size=(samples, 6, 2))
+    targets[..., 2] = rng.uniform(-170.0, 30.0, size=(samples, 6))
+    return targets
+
+
+def ik_backends() -> Dict[str, object]:
+    lengths = (Hexapod.COXA_LENGTH, Hexapod.FEMUR_LENGTH, Hexapod.TIBIA_LENGTH)
+    backends = {name: cls(*lengths) for name, cls in Hexapod.IK_BACKENDS.items()}
+    backends["analytic+cache"] = CachedIK(kinematics.AnalyticIK(*lengths))
+    return backends
+
+
+def roundtrip_error(backend, targets: np.ndarray, cal: np.ndarray):
+    """IK -> FK position error in mm, for raw joints and for int servo commands."""
+    lengths = (Hexapod.COXA_LENGTH, Hexapod.FEMUR_LENGTH, Hexapod.TIBIA_LENGTH)
+    joints, valid = backend.solve(targets)
+    raw = kinematics.solve_positions(joints, *lengths)
+    servo = kinematics.joints_to_servo(joints, cal).astype(np.int64)
+    commanded = kinematics.solve_positions(kinematics.servo_to_joints(servo, cal), *lengths)
+
+    #clipped servos cannot reach the target, only compare unclipped legs
+    unclipped = valid & np.all((servo > 0) & (servo < 180), axis=-1)
+    raw_err = np.linalg.norm(raw - targets, axis=-1)[unclipped]
+    servo_err = np.linalg.norm(commanded - targets, axis=-1)[unclipped]
+    return raw_err, servo_err, unclipped.mean()
+
+
+@click.group()
+def cli() -> None:
+    pass
+
+
+@cli.command()
+@click.option("--samples", type=int, default=5000, help="Frames of six targets to sweep")
+@click.option("--backend", "names", multiple=True, help="Backends to run, default all")
+def ik(samples: int, names) -> None:
+    """Throughput and IK->FK round trip error for every IK backend."""
+    targets = workspace_sweep(samples)
+    cal = np.zeros((6, 3))
+    backends = ik_backends()
+    for name in names or backends:
+        backend = backends[name]
+        start = time.perf_counter()
+        for frame in targets:
+            backend.solve(frame)
+        per_frame = time.perf_counter() - start
+
+        start = time.perf_counter()
+        backend.solve(targets)
+        batched = time.perf_counter() - start
+
+        raw_err, servo_err, coverage = roundtrip_error(backend, targets, cal)
+        click.echo(
+            f"{name:16s} frame: {6*samples/per_frame:10.0f} solves/s  "
+            f"batch: {6*samples/batched:10.0f} solves/s  "
+            f"raw err mean/max {raw_err.mean():.3f}/{raw_err.max():.3f} mm  "
+            f"servo err mean/max {servo_err.mean():.2f}/{servo_err.max():.2f} mm  "
+            f"({100*coverage:.0f}% legs compared)")
+
+
+TESTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests")
+
+
+@cli.command("gait")
+@click.option("--frames", type=int, default=20000, help="Walking frames per gait")
+@click.option("--config", "config_file_path", default="robot_config.json", help="Robot config to load")
+def gait_cmd(frames: int, config_file_path: str) -> None:
+    """Walking frame rate of the gait engine against the legacy gait methods (tests/gait_legacy.py)."""
+    sys.path.insert(0, TESTS_DIR)
+    from gait_legacy import LegacyGaitHexapod
+    for gait_id, name in Hexapod.gait_id_to_name.items():
+        rates = []
+        for cls in (Hexapod, LegacyGaitHexapod):
+            robot = cls(config_file_path)
+            robot.set_mode(robot.MODE_WALK)
+            robot.set_gait(gait_id)
+            robot.controller.analog = lambda key, robot=robot: 64 if key == robot.AS_RY else 128
+            start = time.perf_counter()
+            for _ in range(frames):
+                robot.walk()
+            rates.append(frames/(time.perf_counter() - start))
+        click.echo(f"{name:10s} engine: {rates[0]:9.0f} frames/s  legacy: {rates[1]:9.0f} frames/s")
+
+
+#***********************************************************************
+# Golden traces
+# Scripted controller sessions replayed through Hexapod.loop on a fake
+# clock, so every run sees the same inputs at the same frame times. Foot
+# positions and servo commands of every frame are compared against the
+# traces in golden/, recorded with --update. The robot config is
+# golden/robot_config.json, so calibrating the real robot does not
+# change the traces.
+#***********************************************************************
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+GOLDEN_CONFIG = os.path.join(GOLDEN_DIR, "robot_config.json")
+GOLDEN_FRAME_MS = 20            #fake clock step per frame
+GOLDEN_RATES = dict(input_rate_hz=1000.0/GOLDEN_FRAME_MS,     #every loop() is a kinematics frame
+                    kinematics_rate_hz=1000.0/GOLDEN_FRAME_MS)
+GOLDEN_ATOL = 1e-6              #foot position tolerance in mm
+
+H = Hexapod
+WALK_SCRIPT = [
+    (5, {}, [H.BUT_Y]),                                     #walk mode
+    (60, {H.AS_RY: 0}, []),                                 #forward
+    (40, {H.AS_RY: 60, H.AS_RX: 40}, []),                   #forward, turning
+    (40, {H.THROTTLE_R: 255}, []),                          #strafe
+    (30, {H.AS_RY: 0, H.AS_LY: 0}, []),                     #forward, faster
+    (5, {H.AS_RY: 0}, [H.BUT_START]),                       #slow gait speed
+    (30, {H.AS_RY: 0}, []),
+    (40, {}, []),                                           #release, finish the cycle
+]
+SCENARIOS: Dict[str, List[Tuple[int, Dict, List]]] = {
+    "walk_tripod": [(5, {}, [H.PAD_DOWN])] + WALK_SCRIPT,
+    "walk_wave": [(5, {}, [H.PAD_LEFT])] + WALK_SCRIPT,
+    "walk_ripple": [(5, {}, [H.PAD_UP])] + WALK_SCRIPT,
+    "walk_tetrapod": [(5, {}, [H.PAD_RIGHT])] + WALK_SCRIPT,
+    "walk_gait_change": [
+        (5, {}, [H.BUT_Y]),
+        (40, {H.AS_RY: 0}, []),
+        (30, {H.AS_RY: 0}, [H.PAD_LEFT]),                   #blend tripod -> wave
+        (30, {H.AS_RY: 0}, [H.PAD_RIGHT]),                  #wave -> tetrapod
+        (40, {}, []),
+    ],
+    "translate": [
+        (5, {}, [H.BUT_X]),
+        (30, {H.AS_RY: 0, H.AS_RX: 255}, []),
+        (30, {H.AS_LY: 0, H.AS_LX: 0}, []),
+        (5, {H.AS_LY: 255}, [H.BUT_TL]),                    #capture offsets
+        (20, {}, []),
+    ],
+    "rotate": [
+        (5, {}, [H.BUT_B]),
+        (30, {H.AS_RX: 0, H.AS_LY: 255}, []),
+        (30, {H.AS_RY: 255, H.AS_LX: 0}, []),
+        (20, {}, []),
+    ],
+    "one_leg": [
+        (5, {}, [H.BUT_A]),
+        (30, {H.AS_RY: 0, H.AS_RX: 200}, []),
+        (30, {H.AS_LY: 0, H.AS_LX: 60}, []),
+        (20, {}, []),
+    ],
+}
+
+
+def run_scenario(script, config_file_path: str = GOLDEN_CONFIG,
+                 allocations: bool = False) -> Dict[str, np.ndarray]:
+    """Replay script through Hexapod.loop, returns per-frame traces and timings."""
+    robot = Hexapod(config_file_path, **GOLDEN_RATES)
+    robot.controller = controller = ScriptedController(script)
+    now_ms = [0]
+    robot.clock = lambda: now_ms[0]/1000.0
+
+    frames = len(controller.frames)
+    positions = np.empty((frames, 6, 3))
+    servos = np.empty((frames, 18), dtype=np.int64)
+    latency = np.empty(frames, dtype=np.int64)
+    allocated = np.zeros(frames, dtype=np.int64)
+    if allocations:
+        tracemalloc.start()
+    try:
+        for frame in range(frames):
+            now_ms[0] += GOLDEN_FRAME_MS
+            if allocations:
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter_ns()
+            robot.loop()
+            latency[frame] = time.perf_counter_ns() - start
+            if allocations:
+                allocated[frame] = tracemalloc.get_traced_memory()[1] - base
+            np.add(robot.current, robot.offset, out=positions[frame])
+            servos[frame] = [servo.value for leg in robot.leg_servos for servo in leg]
+    finally:
+        if allocations:
+            tracemalloc.stop()
+    return {"positions": positions, "servos": servos, "latency": latency, "allocated": allocated}
+
+
+def compare_trace(name: str, trace: Dict[str, np.ndarray], golden) -> List[str]:
+    """Deviations of trace from the golden file, empty if it matches."""
+    errors = []
+    for key in ("positions", "servos"):
+        expected = golden[key]
+        actual = trace[key]
+        if actual.shape != expected.shape:
+            errors.append(f"{name}: {key} shape {actual.shape}, golden {expected.shape}")
+            continue
+        if key == "servos":
+            bad = np.any(actual != expected, axis=-1)
+        else:
+            bad = ~np.all(np.isclose(actual, expected, rtol=0.0, atol=GOLDEN_ATOL), axis=(-2, -1))
+        if bad.any():
+            frame = int(np.argmax(bad))
+            errors.append(f"{name}: {key} differ in {int(bad.sum())} frames, first at frame {frame}: "
+                          f"{actual[frame].ravel().tolist()} != {expected[frame].ravel().tolist()}")
+    return errors
+
+
+@cli.command()
+@click.option("--update", is_flag=True, help="Record the golden traces instead of checking them")
+@click.option("--scenario", "names", multiple=True, help="Scenarios to run, default all")
+@click.option("--repeat", type=int, default=20, help="Timed runs per scenario")
+def golden(update: bool, names, repeat: int) -> None:
+    """Replay the scripted scenarios, check them against golden traces and time them."""
+    logging.getLogger("hexapod").setLevel(logging.WARNING)     #one mode/gait line per replay otherwise
+    errors = []
+    for name in names or SCENARIOS:
+        path = os.path.join(GOLDEN_DIR, f"{name}.npz")
+        trace = run_scenario(SCENARIOS[name])
+        if update:
+            np.savez_compressed(path, positions=trace["positions"], servos=trace["servos"])
+            click.echo(f"{name:18s} recorded {len(trace['servos'])} frames to {path}")
+            continue
+        if not os.path.exists(path):
+            errors.append(f"{name}: no golden trace, record it with --update")
+            continue
+        with np.load(path) as data:
+            errors += compare_trace(name, trace, data)
+
+        latency = np.concatenate([trace["latency"]] +
+                                 [run_scenario(SCENARIOS[name])["latency"] for _ in range(repeat - 1)])
+        allocated = run_scenario(SCENARIOS[name], allocations=True)["allocated"]
+        p50, p90, p99 = np.percentile(latency, (50, 90, 99))/1000.0
+        click.echo(
+            f"{name:18s} {1e9/latency.mean():8.0f} frames/s  "
+            f"latency p50/p90/p99/max {p50:6.1f}/{p90:6.1f}/{p99:6.1f}/{latency.max()/1000.0:7.1f} us  "
+            f"alloc mean/max {allocated.mean()/1024:6.1f}/{allocated.max()/1024:6.1f} KiB/frame")
+    for error in errors:
+        click.echo(error, err=True)
+    if errors:
+        raise click.ClickException(f"{len(errors)} golden trace deviations")
+
+
+@cli.command()
+@click.option("--seconds", type=float, default=5.0, help="Run time")
+@click.option("--config", "config_file_path", default=GOLDEN_CONFIG, help="Robot config to load")
+@click.option("--input-rate", type=float, default=None, help="Controller polling rate in Hz")
+@click.option("--kinematics-rate", type=float, default=None, help="Gait/IK rate in Hz")
+@click.option("--servo-rate", type=float, default=None, help="Servo output rate in Hz")
+def schedule(seconds: float, config_file_path: str, input_rate: float, kinematics_rate: float,
+             servo_rate: float) -> None:
+    """Achieved loop rates, start jitter and stage profile of Hexapod.run, walking tripod."""
+    logging.getLogger("hexapod").setLevel(logging.WARNING)
+    robot = Hexapod(config_file_path, input_rate_hz=input_rate, kinematics_rate_hz=kinematics_rate,
+                    servo_rate_hz=servo_rate)
+    robot.controller = ScriptedController([(1, {}, [Hexapod.BUT_Y]), (1, {Hexapod.AS_RY: 0}, [])])
+    scheduler = robot.scheduler
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        scheduler.wait()
+        start = time.perf_counter_ns()
+        robot.loop()
+        robot.profiler.record("frame", time.perf_counter_ns() - start)
+    click.echo(robot.rate_report())
+    click.echo(robot.profiler.report())
+
+
+IK_LOOP_OPTIONS = {
+    "analytic": {},
+    "table": {"ik_backend": "table"},
+    "fixed": {"ik_backend": "fixed"},
+    "analytic+cache": {"ik_cache_size": 4096},
+}
+
+
+@cli.command("ik-loop")
+@click.option("--frames", type=int, default=5000, help="Walking frames timed per IK option")
+@click.option("--warmup", type=int, default=1000, help="Frames run first to fill caches and tables")
+def ik_loop(frames: int, warmup: int) -> None:
+    """legs_IK time per live walking frame for every IK option of Hexapod."""
+    logging.getLogger("hexapod").setLevel(logging.WARNING)
+    for name, options in IK_LOOP_OPTIONS.items():
+        robot = Hexapod(GOLDEN_CONFIG, **GOLDEN_RATES, **options)
+        robot.controller = ScriptedController([(1, {}, [Hexapod.BUT_Y]),
+                                               (warmup + frames, {Hexapod.AS_RY: 0}, [])])
+        now_ms = [0]
+        robot.clock = lambda: now_ms[0]/1000.0
+        legs_IK = robot.legs_IK
+        elapsed = []
+        def timed(targets):
+            start = time.perf_counter_ns()
+            legs_IK(targets)
+            elapsed.append(time.perf_counter_ns() - start)
+        robot.legs_IK = timed
+        for _ in range(warmup + frames):
+            now_ms[0] += GOLDEN_FRAME_MS
+            robot.loop()
+        per_frame = np.array(elapsed[-frames:])/1000.0
+        click.echo(f"{name:16s} legs_IK mean {per_frame.mean():6.1f} us  p50/p99 "
+                   f"{np.percentile(per_frame, 50):6.1f}/{np.percentile(per_frame, 99):6.1f} us per frame")
+
+
+ALLOC_TOLERANCE = 1024          #bytes a window may end up holding (counters growing past a digit, buffers in flight)
+TRANSIENT_TOLERANCE = 1536      #peak bytes a frame may hold while it runs, see measure_alloc
+ALLOC_SCENARIOS = (("walk", Hexapod.BUT_Y), ("translate", Hexapod.BUT_X), ("rotate", Hexapod.BUT_B))
+
+
+def measure_alloc(button: int, frames: int, warmup: int) -> Tuple[int, int, float]:
+    """Retained bytes, GC runs and mean transient bytes per frame of a steady-state mode.
+
+    Transient is the traced peak above the frame's starting memory. It is
+    not zero: the scalar IK and servo output convert the leg arrays to
+    lists, and gait sampling takes row views of the gait table.
+    """
+    robot = Hexapod(GOLDEN_CONFIG, **GOLDEN_RATES)
+    robot.controller = ScriptedController([(1, {}, [button]),
+                                           (warmup + 2*frames, {Hexapod.AS_RY: 0, Hexapod.AS_LX: 60}, [])])
+    now_ms = [0]
+    robot.clock = lambda: now_ms[0]/1000.0
+    #warm up traced, so caches (gait tables, numpy's buffer cache, free lists) fill before measuring
+    gc.collect()
+    tracemalloc.start()
+    try:
+        for _ in range(warmup):
+            now_ms[0] += GOLDEN_FRAME_MS
+            robot.loop()
+
+        collections = []
+        callback = lambda phase, info: phase == "start" and collections.append(info["generation"])
+        gc.callbacks.append(callback)
+        start = tracemalloc.get_traced_memory()[0]
+        for _ in range(frames):
+            now_ms[0] += GOLDEN_FRAME_MS
+            robot.loop()
+        retained = tracemalloc.get_traced_memory()[0] - start
+        gc.callbacks.remove(callback)
+
+        transient = 0
+        for _ in range(frames):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            now_ms[0] += GOLDEN_FRAME_MS
+            robot.loop()
+            transient += tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    return retained, len(collections), transient/frames
+
+
+@cli.command()
+@click.option("--frames", type=int, default=2000, help="Steady-state frames measured per scenario")
+@click.option("--warmup", type=int, default=5000, help="Frames run first to fill caches and tables")
+def alloc(frames: int, warmup: int) -> None:
+    """Steady-state allocations of the control loop; fails if frames retain memory, trigger GC or exceed the transient budget."""
+    logging.getLogger("hexapod").setLevel(logging.WARNING)
+    failed = []
+    for name, button in ALLOC_SCENARIOS:
+        retained, gc_runs, transient = measure_alloc(button, frames, warmup)
+        click.echo(f"{name:10s} retained {retained:6d} B over {frames} frames  GC runs {gc_runs:3d}  "
+                   f"transient {transient/1024:5.1f} KiB/frame")
+        if retained > ALLOC_TOLERANCE or gc_runs or transient > TRANSIENT_TOLERANCE:
+            failed.append(name)
+    if failed:
+        raise click.ClickException(f"Loop allocates in steady state: {', '.join(failed)}")
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="[%(levelname)s][%(name)s] %(message)s",
+        handlers=[
+        logging.StreamHandler()
+        ]
+    )
+    cli()
@@ -0,0 +1,116 @@
+#***********************************************************************
+# Choreography
+# Keyframed body poses and foot positions, compiled ahead of time into
+# motion clips (see motion_clip.py) through batched trajectory IK, so
+# playback from the main loop does no interpretation or solving.
+#
+# A choreography comes from the CHOREOGRAPHIES list of the robot
+# config:
+#   {"name": "wave_hello", "keyframes": [
+#     {"t": 0},
+#     {"t": 800, "body": [0, 0, 20, 0, 10, 0], "ease": "cosine"},
+#     {"t": 1600, "feet": {"0": [40, 40, 60]}},
+#     ...]}
+# t is in ms from the start. body is the toe translation X/Y/Z (mm, same
+# sign as translate mode) and rotation X/Y/Z (degrees, as rotate mode).
+# feet maps leg numbers to foot offsets from home (mm). Values not
+# given in a keyframe hold from the previous one. ease is the
+# interpolation from the previous keyframe, linear or cosine.
+#***********************************************************************
+import math
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+import kinematics
+from motion_clip import CLIP_FRAME_MS
+
+logger = logging.getLogger(__name__)
+
+EASINGS = ("linear", "cosine")
+
+
+@dataclass(frozen=True)
+class Keyframe:
+    t: float
+    body: Optional[Tuple[float, ...]] = None
+    feet: Optional[Tuple[Tuple[int, Tuple[float, float, float]], ...]] = None
+    ease: str = "linear"
+
+    def __post_init__(self):
+        if self.ease not in EASINGS:
+            raise ValueError(f"Keyframe at {self.t} ms: ease {self.ease} not in {EASINGS}")
+        if self.body is not None and len(self.body) != 6:
+            raise ValueError(f"Keyframe at {self.t} ms: body needs 6 values, got {len(self.body)}")
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "Keyframe":
+        body = config.get("body")
+        feet = config.get("feet")
+        return cls(
+            t=float(config["t"]),
+            body=tuple(float(v) for v in body) if body is not None else None,
+            feet=tuple(sorted((int(leg), tuple(float(v) for v in offset))
+                              for leg, offset in feet.items())) if feet is not None else None,
+            ease=config.get("ease", "linear"))
+
+
+@dataclass(frozen=True)
+class Choreography:
+    name: str
+    keyframes: Tuple[Keyframe, ...]
+
+    def __post_init__(self):
+        times = [k.t for k in self.keyframes]
+        if len(times) < 2 or times[0] != 0 or any(b <= a for a, b in zip(times, times[1:])):
+            raise ValueError(f"Choreography {self.name}: needs 2+ keyframes, times from 0 and increasing")
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "Choreography":
+        return cls(
+            name=config["name"],
+            keyframes=tuple(Keyframe.from_config(k) for k in config["keyframes"]))
+
+    @property
+    def duration_ms(self) -> float:
+        return self.keyframes[-1].t
+
+
+def keyframe_poses(choreography: Choreography) -> Tuple[np.ndarray, np.ndarray]:
+    """(keyframes, 6) body poses and (keyframes, 6, 3) foot offsets, held values filled in."""
+    body = np.zeros((len(choreography.keyframes), 6))
+    feet = np.zeros((len(choreography.keyframes), 6, 3))
+    for i, keyframe in enumerate(choreography.keyframes):
+        if i > 0:
+            body[i] = body[i - 1]
+            feet[i] = feet[i - 1]
+        if keyframe.body is not None:
+            body[i] = keyframe.body
+        for leg, offset in keyframe.feet or ():
+            feet[i, leg] = offset
+    return body, feet
+
+
+def choreography_targets(robot, choreography: Choreography,
+                         frame_ms: float = CLIP_FRAME_MS) -> np.ndarray:
+    """(frames, 6, 3) foot targets sampled every frame_ms."""
+    body_keys, feet_keys = keyframe_poses(choreography)
+    key_times = np.array([k.t for k in choreography.keyframes])
+    times = np.arange(0.0, choreography.duration_ms + frame_ms/2, frame_ms)
+
+    #segment and eased fraction for every frame
+    seg = np.clip(np.searchsorted(key_times, times, side="right"), 1, len(key_times) - 1)
+    u = np.clip((times - key_times[seg - 1])/(key_times[seg] - key_times[seg - 1]), 0.0, 1.0)
+    cosine = np.array([k.ease == "cosine" for k in choreography.keyframes])[seg]
+    u = np.where(cosine, 0.5 - 0.5*np.cos(math.pi*u), u)
+
+    body = body_keys[seg - 1] + u[:, None]*(body_keys[seg] - body_keys[seg - 1])
+    feet = feet_keys[seg - 1] + u[:, None, None]*(feet_keys[seg] - feet_keys[seg - 1])
+
+    targets = robot.home + feet
+    targets += body[:, None, 0:3]
+    for i, (rot_x, rot_y, rot_z) in enumerate(np.radians(body[:, 3:6])):
+        targets[i] += robot.body_rotation_offsets(kinematics.rotation_matrix(rot_x, rot_y, rot_z))
+    return targets
@@ -8,15 +8,20 @@ logger = logging.getLogger(__name__)
 @dataclass
 class RuntimeConfig:
     sigint: bool = False
+    dump_profile: bool = False      # log the loop profile on the next frame (SIGUSR1)
 
 rconf = RuntimeConfig()
 
 def signal_handler(sig: int, frame) -> None:
     rconf.sigint = True
 
+def profile_signal_handler(sig: int, frame) -> None:
+    rconf.dump_profile = True
+
 def set_disposition() -> None:
     logger.info("Setting disposition")
     signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGUSR1, profile_signal_handler)
 
 def map(x: float, in_min: float, in_max: float, out_min: float, out_max: float) -> float:
     return (x - in_min) * (out_max - out_min) / (in_max - in_min) + out_min
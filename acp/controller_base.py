@@ -1,4 +1,5 @@
 import logging
+import queue
 import time
 from typing import Union, Dict, List
 from spec.ttypes import ButtonID, AxisID
@@ -14,6 +15,7 @@ class ControllerBase:
         self.button_states: Dict = {}
         self.slow_button_old: Dict = {}
         self.slow_button_new: Dict = {}
+        self.clip_requests: queue.Queue = queue.Queue()    # (name, speed) motion clips to play
         self.await_controller()
 
         for axis in AxisID._NAMES_TO_VALUES:
@@ -48,8 +50,15 @@ class ControllerBase:
         return analog_id > 0.5 if to_bin else self.axis_states[analog_id]
 
     def read_gamepad(self, vibrate: bool = False):
-        self.slow_button_old: Dict = self.slow_button_new.copy()
-        self.slow_button_new: Dict = self.button_states.copy()
+        # swap the two snapshots and refill the new one in place, no dicts allocated per frame
+        self.slow_button_old, self.slow_button_new = self.slow_button_new, self.slow_button_old
+        self.slow_button_new.update(self.button_states)
+
+    def clip_request(self):
+        try:
+            return self.clip_requests.get_nowait()
+        except queue.Empty:
+            return None
 
     def terminate(self) -> None:
         self._terminate_monitor = True
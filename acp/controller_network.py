@@ -27,9 +27,10 @@ def _ensure_single(f):
 
 class _NetworkController:
 
-    def __init__(self, button_status, axises_status):
+    def __init__(self, button_status, axises_status, clip_requests):
         self._button_status = button_status
         self._axises_status = axises_status
+        self._clip_requests = clip_requests
         self.log_queue = queue.Queue()
         self.queue_handler = QueueHandler(self.log_queue)
         root_logger = logging.getLogger()
@@ -50,6 +51,11 @@ class _NetworkController:
     def button(self, id, value):
         button_name = ButtonID._VALUES_TO_NAMES[id].lower() # TODO remove lower() after migration to thrift
         self._button_status[button_name] = int(value)
+
+    @_ensure_single
+    def play_clip(self, name, speed):
+        logger.debug("play_clip %s x%s", name, speed)
+        self._clip_requests.put((name, speed))
     
     @_ensure_single
     def get_logs(self, offset: int):
@@ -72,7 +78,7 @@ class NetworkController(ControllerBase):
         
 
     def _monitor_dev(self, vibrate: bool = False) -> None:
-        handler = _NetworkController(self.button_states, self.axis_states)
+        handler = _NetworkController(self.button_states, self.axis_states, self.clip_requests)
         processor = ARR_proto.Processor(handler)
         transport = TSocket.TServerSocket(port=9090)
         tfactory = TTransport.TBufferedTransportFactory()
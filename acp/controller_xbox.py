@@ -201,8 +201,12 @@ class XboxOneController:
         return analog_id > 0.5 if to_bin else self.axis_states[analog_id]
 
     def read_gamepad(self, vibrate: bool = False):
-        self.slow_button_old: Dict = self.slow_button_new.copy()
-        self.slow_button_new: Dict = self.button_states.copy()
+        # swap the two snapshots and refill the new one in place, no dicts allocated per frame
+        self.slow_button_old, self.slow_button_new = self.slow_button_new, self.slow_button_old
+        self.slow_button_new.update(self.button_states)
+
+    def clip_request(self):
+        return None
 
 
     def terminate(self) -> None:
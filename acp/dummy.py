@@ -4,6 +4,8 @@ logger = logging.getLogger(__name__)
 
 
 class DummyServo:
+  __slots__ = ("value",)
+
   def __init__(self):
     self.value = 0
 
@@ -16,6 +18,9 @@ class DummyServo:
     logger.debug(f"servo read {self.value}")
     return self.value
 
+  def release(self):
+    logger.debug("servo release")
+
 
 class DummyController:
   def __init__(self):
@@ -34,11 +39,47 @@ class DummyController:
 
   def read_gamepad(self, vibrate: int):
     pass
+
+  def clip_request(self):
+    return None
   
   def terminate(self) -> None:
     pass
 
 
+class ScriptedController(DummyController):
+  """Replays a fixed input script, one gamepad read per frame.
+
+  The script is a list of (frames, axes, buttons) steps: axes maps axis
+  ids to values held for the step (unlisted axes are centered), buttons
+  are pressed on the first frame of the step and released after it.
+  """
+  CENTER = 128
+
+  def __init__(self, script):
+    self.frames = []
+    for frames, axes, buttons in script:
+      for i in range(frames):
+        self.frames.append((axes, buttons if i == 0 else ()))
+    self.frame = -1
+
+  @property
+  def done(self) -> bool:
+    return self.frame + 1 >= len(self.frames)
+
+  def analog(self, id):
+    return self.frames[self.frame][0].get(id, self.CENTER)
+
+  def button_pressed(self, button: int):
+    return button in self.frames[self.frame][1]
+
+  def button(self, button: int) -> bool:
+    return button in self.frames[self.frame][1]
+
+  def read_gamepad(self, vibrate: int):
+    self.frame = min(self.frame + 1, len(self.frames) - 1)
+
+
 class DummyLed:
 
     def __init__(self, id: int):
@@ -0,0 +1,172 @@
+#***********************************************************************
+# Data-driven gait engine
+# A gait is a per-leg phase offset (fraction of the cycle where that
+# leg's swing starts), a duty factor (fraction of the cycle on the
+# ground) and swing/stance profiles. gait_coefficients evaluates a
+# definition at any cycle phase in [0, 1), so one frame for all legs is
+# home + amplitudes*coefficients; compile_gait samples it into a
+# (ticks, 6, 3) table, cached per (gait, ticks) in a bounded LRU, and
+# sample_gait reads a table at any phase. Swing is a cosine arc or a
+# cubic Bezier shaped by lift/landing; either way the curve is only
+# evaluated when a table is compiled, so the per-frame cost is the same.
+#***********************************************************************
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+M_PI = 3.141592             #same truncated pi as Hexapod.M_PI, keeps foot paths unchanged
+
+SWING_PROFILES = ("cosine", "bezier")
+STANCE_PROFILES = ("cosine", "linear")
+
+
+@dataclass(frozen=True)
+class GaitDefinition:
+    name: str
+    phases: int
+    duty: float
+    offsets: Tuple[float, ...]
+    swing: str = "cosine"
+    stance: str = "linear"
+    lift: float = 0.5           #bezier swing: 0 moves forward right away, 1 lifts straight up first
+    landing: float = 0.5        #bezier swing: same for setting the foot down
+
+    def __post_init__(self):
+        if not 0.0 < self.duty < 1.0:
+            raise ValueError(f"Gait {self.name}: duty factor must be in (0, 1), got {self.duty}")
+        if not (0.0 <= self.lift <= 1.0 and 0.0 <= self.landing <= 1.0):
+            raise ValueError(f"Gait {self.name}: lift and landing must be in [0, 1]")
+        if self.swing not in SWING_PROFILES:
+            raise ValueError(f"Gait {self.name}: swing profile {self.swing} not in {SWING_PROFILES}")
+        if self.stance not in STANCE_PROFILES:
+            raise ValueError(f"Gait {self.name}: stance profile {self.stance} not in {STANCE_PROFILES}")
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "GaitDefinition":
+        return cls(
+            name=config["name"],
+            phases=int(config["phases"]),
+            duty=float(config["duty"]),
+            offsets=tuple(float(o) for o in config["offsets"]),
+            swing=config.get("swing", "cosine"),
+            stance=config.get("stance", "linear"),
+            lift=float(config.get("lift", 0.5)),
+            landing=float(config.get("landing", 0.5)))
+
+
+TRIPOD = GaitDefinition("Tripod", phases=2, duty=1/2,
+                        offsets=(0, 1/2, 0, 1/2, 0, 1/2), stance="cosine")
+WAVE = GaitDefinition("Wave", phases=6, duty=5/6,
+                      offsets=tuple(s/6 for s in (0, 1, 2, 3, 4, 5)))
+RIPPLE = GaitDefinition("Ripple", phases=6, duty=4/6,
+                        offsets=tuple(s/6 for s in (5, 1, 3, 0, 4, 2)))
+TETRAPOD = GaitDefinition("Tetrapod", phases=3, duty=2/3,
+                          offsets=tuple(s/3 for s in (0, 1, 2, 0, 2, 1)))
+
+
+def cycle_ticks(definition: GaitDefinition, num_ticks: int) -> int:
+    return definition.phases*num_ticks
+
+
+def bernstein_basis(s: np.ndarray) -> np.ndarray:
+    """(..., 4) cubic Bernstein polynomials at s in [0, 1]."""
+    t = 1.0 - s
+    return np.stack((t*t*t, 3.0*t*t*s, 3.0*t*s*s, s*s*s), axis=-1)
+
+
+def bezier_controls(definition: GaitDefinition) -> np.ndarray:
+    """(4, 2) control points of the swing curve, columns X/Y coefficient and Z.
+
+    X/Y goes from -1 to 1; lift/landing pull the inner control points
+    back toward the ends, so the foot leaves and lands more vertically.
+    Z control points of 4/3 put the apex at exactly 1.
+    """
+    return np.array([
+        [-1.0, 0.0],
+        [-1.0 + 2.0/3.0*(1.0 - definition.lift), 4.0/3.0],
+        [1.0 - 2.0/3.0*(1.0 - definition.landing), 4.0/3.0],
+        [1.0, 0.0],
+    ])
+
+
+def gait_coefficients(definition: GaitDefinition, phase) -> np.ndarray:
+    """(..., legs, 3) coefficients at cycle phase(s) in [0, 1), see compile_gait."""
+    phase = np.asarray(phase, dtype=np.float64)
+    swing = 1.0 - definition.duty
+    offsets = np.array(definition.offsets)
+
+    #phase within each leg's own cycle, swing first
+    leg_phase = (phase[..., None] - offsets) % 1.0
+    swinging = leg_phase < swing
+    s = np.where(swinging, leg_phase, 0.0)/swing
+    u = np.where(swinging, 0.0, leg_phase - swing)/definition.duty
+
+    if definition.swing == "bezier":
+        swing_xy, swing_z = np.moveaxis(bernstein_basis(s) @ bezier_controls(definition), -1, 0)
+    else:
+        swing_xy = -np.cos(M_PI*s)
+        swing_z = np.sin(M_PI*s)
+    if definition.stance == "cosine":
+        stance_xy = np.cos(M_PI*u)
+    else:
+        stance_xy = 1.0 - 2.0*u
+
+    coefficients = np.empty(leg_phase.shape + (3,))
+    coefficients[..., 0] = np.where(swinging, swing_xy, stance_xy)
+    coefficients[..., 1] = coefficients[..., 0]
+    coefficients[..., 2] = np.where(swinging, swing_z, 0.0)
+    return coefficients
+
+
+@lru_cache(maxsize=64)
+def compile_gait(definition: GaitDefinition, num_ticks: int) -> np.ndarray:
+    """(cycle ticks, legs, 3) coefficients for X/Y (times amplitude) and Z (times |amplitude|)."""
+    ticks = cycle_ticks(definition, num_ticks)
+    table = gait_coefficients(definition, np.arange(ticks)/ticks)
+    table.flags.writeable = False
+    return table
+
+
+def sample_gait(table: np.ndarray, phase: float, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """(legs, 3) coefficients at cycle phase in [0, 1), linear between table rows.
+
+    With out, the result is written there instead of a new array.
+    """
+    x = phase*len(table)
+    i = int(x)
+    a = table[i % len(table)]
+    b = table[(i + 1) % len(table)]
+    if out is None:
+        return a + (x - i)*(b - a)
+    np.subtract(b, a, out=out)
+    out *= x - i
+    out += a
+    return out
+
+
+TRANSITION_SAMPLES = 24         #candidate phases per phase slot when planning a transition
+
+
+def plan_transition(source: GaitDefinition, target: GaitDefinition, phase: float) -> float:
+    """Phase of target whose foot coefficients are closest to source at phase.
+
+    Starting the target gait there keeps every leg near where it already
+    is, so a blend between the two is short and smooth.
+    """
+    current = gait_coefficients(source, phase)
+    table = compile_gait(target, TRANSITION_SAMPLES)
+    cost = np.sum((table - current)**2, axis=(1, 2))
+    return int(np.argmin(cost))/len(table)
+
+
+def load_gaits(configs: List[Dict]) -> Dict[int, GaitDefinition]:
+    """Gait definitions from the GAITS list of the robot config, keyed by id."""
+    gaits = {}
+    for config in configs:
+        gaits[int(config["id"])] = GaitDefinition.from_config(config)
+    return gaits
@@ -18,9 +18,23 @@ import time
 import logging
 import math
 import json
+import copy
 from typing import List, Dict
+import numpy as np
 from common import map, constrain
 from dummy import DummyController, DummyServo
+import kinematics
+import gait
+from kinematics import AnalyticIK
+from ik_table import TableIK
+from ik_fixed import FixedPointIK
+from ik_cache import CachedIK
+from motion_clip import ClipLibrary, MotionClip
+from lookahead import LookAhead
+from scheduler import FixedRateScheduler, RateCounter
+from profiler import StageProfiler
+from realtime import RealtimeMode
+import choreography
 
 logger = logging.getLogger(__name__)
 
@@ -43,11 +57,22 @@ class Hexapod:
 
   TRAVEL = 30                #translate and rotate travel limit constant
 
+  ALL_LEGS = np.arange(6)
+  CLAMP_TARGETS = True       #project out-of-reach targets instead of freezing the leg
+  REACH_MARGIN = 0.5         #mm kept inside the reach limits when projecting
+
   A12DEG = 209440           #12 degrees in radians x 1,000,000
   A30DEG = 523599           #30 degrees in radians x 1,000,000
 
   SERVO_TIME_MS = 100
-  FRAME_TIME_MS = 10         #frame time (20msec = 50Hz)
+  FRAME_TIME_MS = 10         #frame time (10msec = 100Hz)
+
+  # Loop rates. Input is polled every loop tick; kinematics (gait, modes,
+  # IK) and servo output run on every Nth tick, so the input rate must be
+  # a multiple of both. Servo output None follows kinematics.
+  INPUT_RATE_HZ = 200.0
+  KINEMATICS_RATE_HZ = 1000.0/FRAME_TIME_MS
+  SERVO_RATE_HZ = None
 
   HOME_X = [  82.0,   0.0, -82.0,  -82.0,    0.0,  82.0]  #coxa-to-toe home positions
   HOME_Y = [  82.0, 116.0,  82.0,  -82.0, -116.0, -82.0]
@@ -88,19 +113,23 @@ class Hexapod:
   THROTTLE_L = "throttle_l"
   THROTTLE_R = "throttle_r"
 
+  AS_SPEED = AS_LY           #walking speed axis, None to disable
+
   GAIT_TRIP = 0
   GAIT_WAVE = 1
   GAIT_RIPP = 2
   GAIT_TETR = 3
   GAIT_DEFAULT = GAIT_TRIP
 
-  gait_id_to_name: Dict[int,str] = {
-    GAIT_TRIP: "Tripod", 
-    GAIT_WAVE: "Wave", 
-    GAIT_RIPP: "Ripple", 
-    GAIT_TETR: "Tetrapod"
+  GAITS: Dict[int,gait.GaitDefinition] = {
+    GAIT_TRIP: gait.TRIPOD,
+    GAIT_WAVE: gait.WAVE,
+    GAIT_RIPP: gait.RIPPLE,
+    GAIT_TETR: gait.TETRAPOD
     }
 
+  gait_id_to_name: Dict[int,str] = {gait_id: definition.name for gait_id, definition in GAITS.items()}
+
   MODE_IDLE = 0
   MODE_WALK = 1
   MODE_CXYZ = 2
@@ -117,12 +146,26 @@ class Hexapod:
     MODE_CALI: "Calibration"
     }
 
+  IK_BACKENDS = {
+    "analytic": AnalyticIK,
+    "table": TableIK,
+    "fixed": FixedPointIK
+    }
+
  
   #***********************************************************************
   # Initialization Routine
   #***********************************************************************
-  def __init__(self, config_file_path: str):
-    
+  def __init__(self, config_file_path: str, ik_backend: str = "analytic",
+               ik_cache_size: int = 0, ik_cache_resolution: float = 0.1,
+               lookahead: int = 0, realtime: RealtimeMode = None,
+               input_rate_hz: float = None, kinematics_rate_hz: float = None,
+               servo_rate_hz: float = None, clip_cache_dir: str = None):
+
+    #threads started from here on stay off the real-time loop core
+    self.realtime = realtime
+    if realtime is not None:
+      realtime.isolate()
     self.cal_values = {
       "coxa": self.COXA_CAL,
       "femur": self.FEMUR_CAL,
@@ -130,25 +173,48 @@ class Hexapod:
     }
 
     self.config_file_path = config_file_path
+    self.gait_config: List[Dict] = []
+    self.clip_buttons: Dict[str,str] = {}
+    self.choreography_config: List[Dict] = []
+    self.walk_generation: int = 0               #bumped when walking state changes outside step_walk
+    self.clips = ClipLibrary(clip_cache_dir)
+    self.last_targets = np.full((6, 3), np.nan)   #targets of the last servo write per leg, see legs_IK
     self.reload_config()
 
+    if ik_backend not in self.IK_BACKENDS:
+      raise ValueError(f"IK backend {ik_backend} not found. Valid options: {list(self.IK_BACKENDS)}")
+    self.ik_base = self.IK_BACKENDS[ik_backend](self.COXA_LENGTH, self.FEMUR_LENGTH, self.TIBIA_LENGTH)   #stateless
+    self.ik = self.ik_base
+    if ik_cache_size > 0:
+      self.ik = CachedIK(self.ik, resolution=ik_cache_resolution, max_size=ik_cache_size)
+    self.scalar_IK = type(self.ik) is AnalyticIK   #live frames solved leg by leg, see legs_IK
+    self.ik_solves: int = 0
+    self.ik_skipped: int = 0
+    self.ik_clamped: int = 0                    #out-of-reach leg-frames
+    self.leg_clamped = np.zeros(6, dtype=bool)
+    self.servo_angles = np.full((6, 3), 90, dtype=np.int64)   #last commanded leg servo angles
+    self.servo_pending: List[bool] = [False] * 6               #legs commanded since the last servo output
+
     # Variable Declarations
     self.batt_voltage_array = []
     self.batt_voltage = 0
-    self.currentTime = self.get_current_time_ms()
-    self.previousTime = self.get_current_time_ms()
-
-    self.offset_X: List[float] = [0] * 6
-    self.offset_Y: List[float] = [0] * 6
-    self.offset_Z: List[float] = [0] * 6
-    self.current_X: List[float] = [0] * 6
-    self.current_Y: List[float] = [0] * 6
-    self.current_Z: List[float] = [0] * 6
 
-    self.tripod_case   = [1,2,1,2,1,2]     #for tripod gait walking
-    self.ripple_case   = [2,6,4,1,3,5]     #for ripple gait
-    self.wave_case     = [1,2,3,4,5,6]     #for wave gait
-    self.tetrapod_case = [1,3,2,1,2,3]     #for tetrapod gait
+    # Leg state is preallocated, one X/Y/Z row per leg; the per-axis
+    # names are views into it, so every update is in place
+    self.offset = np.zeros((6, 3))
+    self.current = np.zeros((6, 3))
+    self.offset_X, self.offset_Y, self.offset_Z = self.offset.T
+    self.current_X, self.current_Y, self.current_Z = self.current.T
+    self.targets = np.zeros((6, 3))             #current + offset, per leg
+    self.moved = np.zeros((6, 3), dtype=bool)   #legs_IK scratch
+    self.dirty_legs = np.zeros(6, dtype=bool)
+    self.gait_coefficients = np.zeros((6, 3))   #step_walk scratch
+    self.blend_coefficients = np.zeros((6, 3))
+    self.rot_offsets = np.zeros((6, 3))         #rotate_control scratch
+
+    #C order like the leg state, mixed layouts make in-place arithmetic buffer
+    self.home = np.ascontiguousarray(np.array([self.HOME_X, self.HOME_Y, self.HOME_Z]).T)
+    self.body_to_toe = self.home + np.array([self.BODY_X, self.BODY_Y, self.BODY_Z]).T   #body center-to-toe vectors
 
     # Object Declarations
     self.controller = DummyController()    # gamepad controller
@@ -171,9 +237,11 @@ class Hexapod:
     self.coxa6_servo  = DummyServo()
     self.femur6_servo = DummyServo()
     self.tibia6_servo = DummyServo()
+    self.collect_leg_servos()
 
     self.capture_offsets = False
     self.step_height_multiplier = 1
+    self.amplitude_key = None
 
     self.mode: int = self.MODE_IDLE
     self.gait: int = self.GAIT_DEFAULT
@@ -183,7 +251,17 @@ class Hexapod:
     self.leg6_IK_control: bool = True
 
     self.gamepad_vibrate: int = 0
-    self.tick: int = 0
+    self.clock = time.monotonic                 #gait time source in seconds
+    self.gait_phase: float = 0.0                #position in the gait cycle, [0, 1)
+    self.gait_time = None                       #clock at the last gait step, None when stopped
+    self.gait_duration = None                   #cycle time in ms, eases toward self.duration
+    self.blend_from = None                      #gait being blended out of, see set_gait
+    self.blend_shift: float = 0.0               #its phase minus self.gait_phase
+    self.blend: float = 1.0                     #blend progress, 1 = done
+    self.set_rates(input_rate_hz or self.INPUT_RATE_HZ, kinematics_rate_hz or self.KINEMATICS_RATE_HZ,
+                   servo_rate_hz or self.SERVO_RATE_HZ)
+    self.lookahead = LookAhead(self, lookahead, 1000.0/self.kinematics_rate_hz) if lookahead > 0 else None
+    self.profiler = StageProfiler()             #per-stage loop timings, see profiler.py
 
     self.z_height_left = 0
     self.z_height_right = 0
@@ -193,87 +271,138 @@ class Hexapod:
     self.cal_pntr: int = 0
     self.cal_inner_pntr: int = 0
 
+    self.clip = None                            #motion clip being played, see play_clip
+    self.clip_start: float = 0.0
+    self.clip_speed: float = 1.0
+    self.recording = None                       #(times, angles) while recording a clip
+    self.compile_clips()
+    self.clips.start_worker()                   #recompiles after calibration, see set_mode
+
   #***********************************************************************
   # Main Program
   #***********************************************************************
   def run(self):
+    if self.realtime is not None:
+      self.realtime.enter()
     while True:
+      self.scheduler.wait()                         #paces ticks on absolute monotonic deadlines
+      start = time.perf_counter_ns()
       self.loop()
-      time.sleep(self.FRAME_TIME_MS/1000)
+      self.profiler.record("frame", time.perf_counter_ns() - start)
+      if self.realtime is not None:
+        self.realtime.idle(self.scheduler.slack_ns())   #garbage collection only in spare frame time
+
+  def set_rates(self, input_rate_hz: float, kinematics_rate_hz: float, servo_rate_hz: float = None) -> None:
+    servo_rate_hz = servo_rate_hz or kinematics_rate_hz
+    ratios = []
+    for name, rate in (("kinematics", kinematics_rate_hz), ("servo", servo_rate_hz)):
+      ratio = input_rate_hz/rate
+      if rate > input_rate_hz or abs(ratio - round(ratio)) > 1e-6:
+        raise ValueError(f"Input rate {input_rate_hz} Hz must be a multiple of the {name} rate {rate} Hz")
+      ratios.append(round(ratio))
+    self.kinematics_every, self.servo_every = ratios
+    self.input_rate_hz = input_rate_hz
+    self.kinematics_rate_hz = kinematics_rate_hz
+    self.servo_rate_hz = servo_rate_hz
+    self.ticks: int = 0
+    self.scheduler = FixedRateScheduler(1000.0/input_rate_hz)
+    self.rates = {"kinematics": RateCounter(), "servo": RateCounter()}
+
+  def rate_report(self) -> str:
+    return (f"input {self.scheduler.report()}; "
+            f"kinematics {self.rates['kinematics'].rate:.1f}/{self.kinematics_rate_hz:.1f} Hz, "
+            f"servo {self.rates['servo'].rate:.1f}/{self.servo_rate_hz:.1f} Hz")
 
   def loop(self):
+    #one input tick, kinematics and servo output on their own multiples of it
+    tick = self.ticks
+    self.ticks += 1
 
-    #set up frame time
-    self.currentTime = self.get_current_time_ms()
-    if self.currentTime - self.previousTime > self.FRAME_TIME_MS:
-      self.previousTime = self.currentTime
-
-      #read controller and process inputs
+    #read controller and process inputs
+    profile = self.profiler
+    with profile.stage("read_gamepad"):
       self.controller.read_gamepad(self.gamepad_vibrate) # TODO vibrate not implemented     
+    with profile.stage("process_gamepad"):
       self.process_gamepad()
 
-      #reset legs to home position when commanded
-      if self.reset_position == True:
-        for leg_num in range(0,6):
-          self.current_X[leg_num] = self.HOME_X[leg_num]
-          self.current_Y[leg_num] = self.HOME_Y[leg_num]
-          self.current_Z[leg_num] = self.HOME_Z[leg_num]
-        self.reset_position = False 
-      
-      #position legs using IK calculations - unless set all to 90 degrees mode
-      if self.mode != self.MODE_CALI:
-        for leg_num in range(0,6):
-          self.leg_IK(leg_num,self.current_X[leg_num]+self.offset_X[leg_num],self.current_Y[leg_num]+self.offset_Y[leg_num],self.current_Z[leg_num]+self.offset_Z[leg_num])       
-
-      #reset leg lift first pass flags if needed
-      if self.mode != self.MODE_OLEG:
-        self.leg1_IK_control = True 
-        self.leg6_IK_control = True
-
-      self.print_debug()                            #print debug data
-
-      #process modes (mode 0 is default 'home idle' do-nothing mode)
-      if self.mode == self.MODE_WALK:               #walking mode
-        if self.gait == self.GAIT_TRIP:
-          self.tripod_gait()
-        elif self.gait == self.GAIT_WAVE:
-          self.wave_gait()
-        elif self.gait == self.GAIT_RIPP:
-          self.ripple_gait()
-        elif self.gait == self.GAIT_TETR:
-          self.tetrapod_gait()
-      elif self.mode == self.MODE_CXYZ:
-        self.translate_control()
-      elif self.mode == self.MODE_CYPR:
-        self.rotate_control()
-      elif self.mode == self.MODE_OLEG:
-        self.one_leg_lift()
-      elif self.mode == self.MODE_CALI:
-        self.set_all_90()
-      
-      self.n_cycles += 1
+    if tick % self.kinematics_every == 0:
+      self.rates["kinematics"].tick()
+      self.kinematics_step()
+
+    #servo output aligned to the PWM period, pulses in between would never be applied
+    if tick % self.servo_every == 0:
+      self.rates["servo"].tick()
+      with profile.stage("servo_write"):
+        self.flush_servos()
+
+  def kinematics_step(self):
+    profile = self.profiler
+
+    #motion clips play straight to the servos, no IK or mode processing
+    if self.clip is not None:
+      with profile.stage("clip"):
+        playing = self.clip_step()
+      if playing:
+        self.n_cycles += 1
+        return
+
+    #reset legs to home position when commanded
+    if self.reset_position == True:
+      self.current[:] = self.home
+      self.reset_position = False 
+    
+    #position legs using IK calculations - unless set all to 90 degrees mode
+    if self.mode != self.MODE_CALI:
+      np.add(self.current, self.offset, out=self.targets)
+      with profile.stage("ik"):
+        self.legs_IK(self.targets)
+
+    #reset leg lift first pass flags if needed
+    if self.mode != self.MODE_OLEG:
+      self.leg1_IK_control = True 
+      self.leg6_IK_control = True
+
+    self.print_debug()                            #print debug data
+
+    #process modes (mode 0 is default 'home idle' do-nothing mode)
+    if self.mode == self.MODE_WALK:               #walking mode
+      with profile.stage("gait"):
+        self.walk()
+    elif self.mode != self.MODE_IDLE:
+      with profile.stage("mode"):
+        if self.mode == self.MODE_CXYZ:
+          self.translate_control()
+        elif self.mode == self.MODE_CYPR:
+          self.rotate_control()
+        elif self.mode == self.MODE_OLEG:
+          self.one_leg_lift()
+        elif self.mode == self.MODE_CALI:
+          self.set_all_90()
+
+    if self.recording is not None:
+      self.recording[0].append(self.clock()*1000.0)
+      self.recording[1].append(self.servo_angles.reshape(18).tolist())
+    
+    self.n_cycles += 1
 
 
   #***********************************************************************
   # Process gamepad controller inputs
   #***********************************************************************
   def process_gamepad(self):
-    if self.controller.button_pressed(self.PAD_DOWN) and self.mode != self.MODE_CALI:    #stop & select gait 0
-      self.set_mode(self.MODE_IDLE)
-      self.set_gait(self.GAIT_TRIP)
-      self.reset_position = True
-    if self.controller.button_pressed(self.PAD_LEFT) and self.mode != self.MODE_CALI:    #stop & select gait 1 
-      self.set_mode(self.MODE_IDLE)
-      self.set_gait(self.GAIT_WAVE)
-      self.reset_position = True
-    if self.controller.button_pressed(self.PAD_UP) and self.mode != self.MODE_CALI:      #stop & select gait 2  
-      self.set_mode(self.MODE_IDLE)
-      self.set_gait(self.GAIT_RIPP)
-      self.reset_position = True
-    if self.controller.button_pressed(self.PAD_RIGHT) and self.mode != self.MODE_CALI:   #stop & select gait 3
-      self.set_mode(self.MODE_IDLE)
-      self.set_gait(self.GAIT_TETR)
-      self.reset_position = True
+    for pad, gait_id in self.gait_pads.items():                                           #select gait
+      if self.controller.button_pressed(pad) and self.mode == self.MODE_WALK:               #blend in while walking
+        self.set_gait(gait_id)
+      elif self.controller.button_pressed(pad) and self.mode != self.MODE_CALI:             #stop & select
+        self.set_mode(self.MODE_IDLE)
+        self.set_gait(gait_id)
+        self.reset_position = True
+    for button, name in self.clip_buttons.items():                                        #play motion clip
+      if self.controller.button_pressed(button) and self.mode != self.MODE_CALI:
+        self.play_clip(name)
+    request = self.controller.clip_request()                                              #motion clip over RPC
+    if request is not None and self.mode != self.MODE_CALI:
+      self.play_clip(*request)
     if self.controller.button_pressed(self.BUT_Y):    #select walk mode
       self.set_mode(self.MODE_WALK)
       self.reset_position = True
@@ -307,10 +436,7 @@ class Hexapod:
       #capture offsets in translate, rotate, and translate/rotate modes
       self.capture_offsets = True
     if self.controller.button_pressed(self.BUT_L2) or self.controller.button_pressed(self.BUT_R2):   # TODO ANALOG to BIN
-      for leg_num in range(0,6):  #clear offsets
-        self.offset_X[leg_num] = 0
-        self.offset_Y[leg_num] = 0
-        self.offset_Z[leg_num] = 0
+      self.offset.fill(0.0)       #clear offsets
       self.leg1_IK_control = True               #reset leg lift first pass flags
       self.leg6_IK_control = True
       self.step_height_multiplier = 1.0         #reset step height multiplier
@@ -376,335 +502,330 @@ class Hexapod:
 
 
   #***********************************************************************
-  # Leg IK Routine
+  # Batched IK Routine
+  # Solves all six legs in one pass. targets is a (6, 3) array of
+  # coxa-to-toe X/Y/Z positions (current + offset).
   #***********************************************************************
-  def leg_IK(self, leg_num: int, X: float, Y: float, Z: float):
-    #compute target femur-to-toe (L3) length
-    L0 = math.sqrt(pow(X,2) + pow(Y,2)) - self.COXA_LENGTH
-    L3 = math.sqrt(pow(L0,2) + pow(Z,2))
-    
-
-    #process only if reach is within possible range (not too long or too short!)
-    if L3 < self.TIBIA_LENGTH+self.FEMUR_LENGTH and L3 > self.TIBIA_LENGTH-self.FEMUR_LENGTH:  
-      #compute tibia angle
-      phi_tibia = math.acos((pow(self.FEMUR_LENGTH,2) + pow(self.TIBIA_LENGTH, 2) - pow(L3,2))/(2*self.FEMUR_LENGTH*self.TIBIA_LENGTH))  # TODO check pow(self.TIBIA_LENGTH, 2????)
-      theta_tibia = phi_tibia*self.RAD_TO_DEG - 23.0 + self.TIBIA_CAL[leg_num]
-      theta_tibia = constrain(theta_tibia,0.0,180.0)
-    
-      #compute femur angle
-      gamma_femur = math.atan2(Z,L0)
-      phi_femur = math.acos((pow(self.FEMUR_LENGTH,2) + pow(L3,2) - pow(self.TIBIA_LENGTH,2))/(2*self.FEMUR_LENGTH*L3))
-      theta_femur = (phi_femur + gamma_femur)*self.RAD_TO_DEG + 14.0 + 90.0 + self.FEMUR_CAL[leg_num]
-      theta_femur = constrain(theta_femur,0.0,180.0)  
-
-      #compute coxa angle
-      theta_coxa = math.atan2(X,Y)*self.RAD_TO_DEG + self.COXA_CAL[leg_num]
-
-      #output to the appropriate leg
-      if leg_num == 0:
-        if self.leg1_IK_control == True:                       #flag for IK or manual control of leg
-          theta_coxa = theta_coxa + 45.0                 #compensate for leg mounting
-          theta_coxa = constrain(theta_coxa,0.0,180.0)
-          self.coxa1_servo.write(int(theta_coxa)) 
-          self.femur1_servo.write(int(theta_femur)) 
-          self.tibia1_servo.write(int(theta_tibia)) 
-        
-      elif leg_num == 1:
-        theta_coxa = theta_coxa + 90.0                 #compensate for leg mounting
-        theta_coxa = constrain(theta_coxa,0.0,180.0)
-        self.coxa2_servo.write(int(theta_coxa)) 
-        self.femur2_servo.write(int(theta_femur)) 
-        self.tibia2_servo.write(int(theta_tibia)) 
-        
-      elif leg_num == 2:
-        theta_coxa = theta_coxa + 135.0                 #compensate for leg mounting
-        theta_coxa = constrain(theta_coxa,0.0,180.0)
-        self.coxa3_servo.write(int(theta_coxa)) 
-        self.femur3_servo.write(int(theta_femur)) 
-        self.tibia3_servo.write(int(theta_tibia)) 
-        
-      elif leg_num == 3:
-        if theta_coxa < 0:                                #compensate for leg mounting
-          theta_coxa = theta_coxa + 225.0                # (need to use different
-        else:                                              #  positive and negative offsets 
-          theta_coxa = theta_coxa - 135.0                #  due to atan2 results above!)
-        theta_coxa = constrain(theta_coxa,0.0,180.0)
-        self.coxa4_servo.write(int(theta_coxa)) 
-        self.femur4_servo.write(int(theta_femur)) 
-        self.tibia4_servo.write(int(theta_tibia)) 
-        
-      if leg_num == 4:
-        if theta_coxa < 0:                                #compensate for leg mounting
-          theta_coxa = theta_coxa + 270.0                # (need to use different
-        else:                                              #  positive and negative offsets 
-          theta_coxa = theta_coxa - 90.0                 #  due to atan2 results above!)
-        theta_coxa = constrain(theta_coxa,0.0,180.0)
-        self.coxa5_servo.write(int(theta_coxa)) 
-        self.femur5_servo.write(int(theta_femur)) 
-        self.tibia5_servo.write(int(theta_tibia)) 
-        
-      if leg_num == 5:
-        if self.leg6_IK_control == True:                       #flag for IK or manual control of leg
-          if theta_coxa < 0:                              #compensate for leg mounting
-            theta_coxa = theta_coxa + 315.0              # (need to use different
-          else:                                            #  positive and negative offsets 
-            theta_coxa = theta_coxa - 45.0               #  due to atan2 results above!)
-          theta_coxa = constrain(theta_coxa,0.0,180.0)
-          self.coxa6_servo.write(int(theta_coxa)) 
-          self.femur6_servo.write(int(theta_femur)) 
-          self.tibia6_servo.write(int(theta_tibia)) 
+  def legs_IK(self, targets: np.ndarray):
+    #only solve and write legs whose target moved since the last write
+    moved = self.moved
+    np.not_equal(targets, self.last_targets, out=moved)
+    np.logical_or(moved[:, 0], moved[:, 1], out=self.dirty_legs)   #elementwise, a reduction allocates
+    np.logical_or(self.dirty_legs, moved[:, 2], out=self.dirty_legs)
+    dirty = np.flatnonzero(self.dirty_legs)
+    self.ik_skipped += 6 - len(dirty)
+    if len(dirty) == 0:
+      self.ik_clamped += np.count_nonzero(self.leg_clamped)
+      return
+    self.ik_solves += len(dirty)
+    if self.scalar_IK:
+      self.legs_IK_scalar(dirty.tolist(), targets.tolist())
+      np.copyto(self.last_targets, targets, where=self.dirty_legs[:, None])
+      return
+    if len(dirty) == 6:
+      dirty = self.ALL_LEGS                   #walking: no per-leg selection to copy
+      solve_targets = targets
+    else:
+      solve_targets = targets[dirty]
+    if self.CLAMP_TARGETS:
+      solve_targets, clamped = kinematics.clamp_to_reach(solve_targets, self.COXA_LENGTH, self.FEMUR_LENGTH, self.TIBIA_LENGTH, self.REACH_MARGIN)
+    joints, valid = self.ik.solve(solve_targets, dirty)
+    if not self.CLAMP_TARGETS:
+      clamped = ~valid
+    self.leg_clamped[dirty] = clamped
+    self.ik_clamped += np.count_nonzero(self.leg_clamped)
+    angles = kinematics.joints_to_servo(joints, self.cal_array, dirty).astype(np.int64)
+    np.copyto(self.last_targets, targets, where=self.dirty_legs[:, None])
+    self.write_legs(dirty.tolist(), angles.tolist(), valid.tolist())
+
+  def legs_IK_scalar(self, legs: List[int], targets: List[List[float]]):
+    #six legs are too few for NumPy's per-call overhead, solve them one by one with math
+    lengths = (self.COXA_LENGTH, self.FEMUR_LENGTH, self.TIBIA_LENGTH)
+    angles = []
+    valid = []
+    for leg_num in legs:
+      X, Y, Z = targets[leg_num]
+      if self.CLAMP_TARGETS:
+        X, Y, Z, clamped = kinematics.clamp_leg(X, Y, Z, *lengths, self.REACH_MARGIN)
+      joints = kinematics.solve_leg(X, Y, Z, *lengths)
+      if not self.CLAMP_TARGETS:
+        clamped = joints is None
+      self.leg_clamped[leg_num] = clamped
+      valid.append(joints is not None)
+      angles.append(None if joints is None else kinematics.leg_to_servo(leg_num, *joints, self.cal_rows[leg_num]))
+    self.ik_clamped += np.count_nonzero(self.leg_clamped)
+    self.write_legs(legs, angles, valid)
+
+  def write_legs(self, legs: List[int], angles: List[List[int]], valid: List[bool]):
+    #command leg angles, the servos get them on the next flush_servos
+    for i, leg_num in enumerate(legs):
+      if not valid[i]:                                    #out of reach, keep previous angles
+        continue
+      if (leg_num == 0 and not self.leg1_IK_control) or (leg_num == 5 and not self.leg6_IK_control):
+        self.last_targets[leg_num] = np.nan               #manual control, re-solve once IK is back
+        continue
+      self.servo_angles[leg_num] = angles[i]
+      self.servo_pending[leg_num] = True
+
+  def flush_servos(self):
+    #write the leg angles commanded since the last servo output
+    pending = self.servo_pending
+    if True not in pending:
+      return
+    angles = self.servo_angles.tolist()
+    for leg_num, (coxa, femur, tibia) in enumerate(self.leg_servos):
+      if pending[leg_num]:
+        coxa.write(angles[leg_num][0])
+        femur.write(angles[leg_num][1])
+        tibia.write(angles[leg_num][2])
+        pending[leg_num] = False
+
+  def invalidate_legs(self):
+    #force IK and servo output for every leg on the next frame
+    self.last_targets.fill(np.nan)
 
 
   #***********************************************************************
-  # Tripod Gait
-  # Group of 3 legs move forward while the other 3 legs provide support
+  # Batch trajectory IK
+  # (ticks, 6, 3) foot targets to (ticks, 18) servo angles ordered like
+  # all_servos (coxa1, femur1, tibia1, coxa2, ...). No servo I/O and no
+  # state is touched, so motions can be precomputed offline or in a
+  # worker thread. Out-of-reach legs hold their previous angles like the
+  # live loop does, starting from initial (default 90 for all servos).
   #***********************************************************************
-  def tripod_gait(self):
-    #read commanded values from controller
-    val_x = self.controller.analog(self.THROTTLE_R) - self.controller.analog(self.THROTTLE_L)
-    commandedY = map(val_x, -255, 255, 127, -127)
-    
-    commandedX = map(self.controller.analog(self.AS_RY),0,255,127,-127) 
-    commandedR = map(self.controller.analog(self.AS_RX),0,255,127,-127)
-      
-    #if commands more than deadband then process
-    if abs(commandedX) > 15 or abs(commandedY) > 15 or abs(commandedR) > 15 or self.tick>0:
-      self.compute_strides(commandedX, commandedY, commandedR)
-      numTicks = round(self.duration / self.SERVO_TIME_MS / 2.0) #total ticks divided into the two cases
-      for leg_num in range(0,6):
-        self.compute_amplitudes(leg_num)
-        if self.tripod_case[leg_num] == 1:                               #move foot forward (raise and lower)
-          self.current_X[leg_num] = self.HOME_X[leg_num] - self.amplitudeX*math.cos(self.M_PI*self.tick/numTicks)
-          self.current_Y[leg_num] = self.HOME_Y[leg_num] - self.amplitudeY*math.cos(self.M_PI*self.tick/numTicks)
-          self.current_Z[leg_num] = self.HOME_Z[leg_num] + abs(self.amplitudeZ)*math.sin(self.M_PI*self.tick/numTicks)
-          if self.tick >= numTicks-1:
-            self.tripod_case[leg_num] = 2
-        elif self.tripod_case[leg_num] == 2:                               #move foot back (on the ground)
-          self.current_X[leg_num] = self.HOME_X[leg_num] + self.amplitudeX*math.cos(self.M_PI*self.tick/numTicks)
-          self.current_Y[leg_num] = self.HOME_Y[leg_num] + self.amplitudeY*math.cos(self.M_PI*self.tick/numTicks)
-          self.current_Z[leg_num] = self.HOME_Z[leg_num]
-          if self.tick >= numTicks-1:
-            self.tripod_case[leg_num] = 1
-      #increment tick
-      if self.tick < numTicks-1:
-        self.tick+=1
-      else: 
-        self.tick = 0
-
+  def trajectory_IK(self, targets: np.ndarray, initial: np.ndarray = None) -> np.ndarray:
+    if self.CLAMP_TARGETS:
+      targets, _ = kinematics.clamp_to_reach(targets, self.COXA_LENGTH, self.FEMUR_LENGTH, self.TIBIA_LENGTH, self.REACH_MARGIN)
+    joints, valid = self.ik_base.solve(targets)
+    angles = kinematics.joints_to_servo(joints, self.cal_array).astype(np.int64)
+
+    if not valid.all():
+      #index of the last valid tick per leg, -1 before the first one
+      ticks = np.arange(len(targets))[:, None]
+      last_valid = np.maximum.accumulate(np.where(valid, ticks, -1), axis=0)
+      held = angles[np.maximum(last_valid, 0), np.arange(6)]
+      if initial is None:
+        initial = np.full(18, 90, dtype=np.int64)
+      held[last_valid < 0] = np.broadcast_to(np.asarray(initial).reshape(6, 3), held.shape)[last_valid < 0]
+      angles = held
+    return angles.reshape(len(targets), 18)
 
   #***********************************************************************
-  # Wave Gait
-  # Legs move forward one at a time while the other 5 legs provide support
+  # Motion clips
+  # Precomputed or recorded 18-channel servo streams (see motion_clip.py,
+  # choreography.py) played at speed times real time. Gait and IK are bypassed while a
+  # clip plays; afterwards the legs return to home through IK.
   #***********************************************************************
-  def wave_gait(self):
-    #read commanded values from controller
-    val_x = self.controller.analog(self.THROTTLE_R) - self.controller.analog(self.THROTTLE_L)
-    commandedY = map(val_x, -255, 255, 127, -127)
-    
-    commandedX = map(self.controller.analog(self.AS_RY),0,255,127,-127) 
-    commandedR = map(self.controller.analog(self.AS_RX),0,255,127,-127)
-
-    #if commands more than deadband then process
-    if abs(commandedX) > 15 or abs(commandedY) > 15 or abs(commandedR) > 15 or self.tick>0:
-      self.compute_strides(commandedX, commandedY, commandedR)
-      numTicks = round(self.duration / self.SERVO_TIME_MS / 6.0) #total ticks divided into the six cases
-      for leg_num in range(0,6):
-        self.compute_amplitudes(leg_num)
-        if self.wave_case[leg_num] == 1:                               #move foot forward (raise and lower)
-          self.current_X[leg_num] = self.HOME_X[leg_num] - self.amplitudeX*math.cos(self.M_PI*self.tick/numTicks)
-          self.current_Y[leg_num] = self.HOME_Y[leg_num] - self.amplitudeY*math.cos(self.M_PI*self.tick/numTicks)
-          self.current_Z[leg_num] = self.HOME_Z[leg_num] + abs(self.amplitudeZ)*math.sin(self.M_PI*self.tick/numTicks)
-          if self.tick >= numTicks-1: 
-            self.wave_case[leg_num] = 6
-        elif self.wave_case[leg_num] == 2:                               #move foot back one-fifth (on the ground)
-          self.current_X[leg_num] = self.current_X[leg_num] - self.amplitudeX/numTicks/2.5
-          self.current_Y[leg_num] = self.current_Y[leg_num] - self.amplitudeY/numTicks/2.5
-          self.current_Z[leg_num] = self.HOME_Z[leg_num]
-          if self.tick >= numTicks-1:
-            self.wave_case[leg_num] = 1
-        elif self.wave_case[leg_num] == 3:                               #move foot back one-fifth (on the ground)
-          self.current_X[leg_num] = self.current_X[leg_num] - self.amplitudeX/numTicks/2.5
-          self.current_Y[leg_num] = self.current_Y[leg_num] - self.amplitudeY/numTicks/2.5
-          self.current_Z[leg_num] = self.HOME_Z[leg_num]
-          if self.tick >= numTicks-1:
-            self.wave_case[leg_num] = 2
-        elif self.wave_case[leg_num] == 4:                               #move foot back one-fifth (on the ground)
-          self.current_X[leg_num] = self.current_X[leg_num] - self.amplitudeX/numTicks/2.5
-          self.current_Y[leg_num] = self.current_Y[leg_num] - self.amplitudeY/numTicks/2.5
-          self.current_Z[leg_num] = self.HOME_Z[leg_num]
-          if self.tick >= numTicks-1:
-            self.wave_case[leg_num] = 3
-        elif self.wave_case[leg_num] == 5:                               #move foot back one-fifth (on the ground)
-          self.current_X[leg_num] = self.current_X[leg_num] - self.amplitudeX/numTicks/2.5
-          self.current_Y[leg_num] = self.current_Y[leg_num] - self.amplitudeY/numTicks/2.5
-          self.current_Z[leg_num] = self.HOME_Z[leg_num]
-          if self.tick >= numTicks-1:
-            self.wave_case[leg_num] = 4
-        elif self.wave_case[leg_num] == 6:                               #move foot back one-fifth (on the ground)
-          self.current_X[leg_num] = self.current_X[leg_num] - self.amplitudeX/numTicks/2.5
-          self.current_Y[leg_num] = self.current_Y[leg_num] - self.amplitudeY/numTicks/2.5
-          self.current_Z[leg_num] = self.HOME_Z[leg_num]
-          if self.tick >= numTicks-1:
-            self.wave_case[leg_num] = 5
-      #increment tick
-      if self.tick < numTicks-1:
-        self.tick+=1
-      else:
-        self.tick = 0
+  CLIP_MIN_SPEED = 0.01                           #slowest playback rate play_clip accepts
+
+  def play_clip(self, name: str, speed: float = 1.0) -> None:
+    if not isinstance(speed, (int, float)) or not math.isfinite(speed) or speed < self.CLIP_MIN_SPEED:
+      logger.warning("Motion clip speed %r is not valid, it must be a number of at least %s", speed, self.CLIP_MIN_SPEED)
+      return
+    try:
+      self.clip = self.clips.get(self, name)
+    except (KeyError, ValueError) as e:
+      logger.warning("%s", e.args[0])
+      return
+    self.clip_speed = float(speed)
+    self.clip_start = self.clock()
+    logger.info("Playing motion clip %s (%s frames, x%.2f)", name, self.clip.frames, self.clip_speed)
+
+  def clip_step(self) -> bool:
+    angles = self.clip.frame((self.clock() - self.clip_start)*1000.0*self.clip_speed)
+    if angles is None:
+      logger.info("Motion clip %s done", self.clip.name)
+      self.clip = None
+      self.reset_position = True
+      self.invalidate_legs()
+      return False
+    self.servo_angles[:] = angles.reshape(6, 3)
+    self.servo_pending[:] = [True] * 6
+    return True
+
+  def start_recording(self) -> None:
+    #capture the commanded servo angles of every frame until stop_recording
+    self.recording = ([], [])
+
+  def stop_recording(self, name: str) -> None:
+    times, angles = self.recording
+    self.recording = None
+    if not times:
+      logger.warning("Nothing recorded for motion clip %s", name)
+      return
+    self.clips.save(MotionClip.from_recording(times, angles, name=name))
+
+  def collect_leg_servos(self):
+    self.leg_servos = [
+      (self.coxa1_servo, self.femur1_servo, self.tibia1_servo),
+      (self.coxa2_servo, self.femur2_servo, self.tibia2_servo),
+      (self.coxa3_servo, self.femur3_servo, self.tibia3_servo),
+      (self.coxa4_servo, self.femur4_servo, self.tibia4_servo),
+      (self.coxa5_servo, self.femur5_servo, self.tibia5_servo),
+      (self.coxa6_servo, self.femur6_servo, self.tibia6_servo),
+    ]
 
 
   #***********************************************************************
-  # Ripple Gait
-  # Left legs move forward rear-to-front while right also do the same,
-  # but right side is offset so RR starts midway through the LM stroke
+  # Walking
+  # Generic gait engine: every gait is a gait.GaitDefinition (per-leg
+  # phase offset, duty factor, swing/stance profile). The cycle phase
+  # advances with the monotonic clock by elapsed/duration, so the loop
+  # rate and dropped frames do not change walking speed or stride. Each
+  # gait has one table of fixed resolution in phase, compiled when the
+  # gaits are loaded; speed only changes how fast the phase moves through
+  # it, so nothing is compiled while walking. Gait changes while walking blend into the new gait instead of
+  # stopping, and speed changes ease the cycle time.
+  # See gait.py for the built-in and config-loaded gaits.
   #***********************************************************************
-  def ripple_gait(self):
+  GAIT_MAX_STEP_S = 0.25                          #longer stalls are not caught up, feet would jump
+  GAIT_BLEND_CYCLES = 0.5                         #gait transition length in gait cycles
+  GAIT_SPEED_TAU_S = 0.5                          #time constant of cycle time changes
+  GAIT_SPEED_RANGE = 2.0                          #full speed stick deflection scales the cycle rate by this
+  GAIT_TABLE_TICKS = 24                           #gait table rows per phase slot, at any speed
+  WALK_DEADBAND = 15                              #stick deflection (of 127) below which a walk axis is ignored
+  #gait cycle times (ms of real time) for normal and slow speed. The
+  #legacy tick gaits ran duration/SERVO_TIME_MS ticks per cycle at about
+  #50 Hz, so their durations 1080 and 3240 walked 216 and 648 ms cycles
+  LEGACY_TICK_MS = 20
+  GAIT_CYCLE_MS = (1080*LEGACY_TICK_MS/SERVO_TIME_MS, 3240*LEGACY_TICK_MS/SERVO_TIME_MS)
+
+  def gait_table(self, definition: gait.GaitDefinition) -> np.ndarray:
+    return self.gait_tables[definition]
+
+  def read_walk_command(self):
     #read commanded values from controller
     val_x = self.controller.analog(self.THROTTLE_R) - self.controller.analog(self.THROTTLE_L)
     commandedY = map(val_x, -255, 255, 127, -127)
     
     commandedX = map(self.controller.analog(self.AS_RY),0,255,127,-127) 
     commandedR = map(self.controller.analog(self.AS_RX),0,255,127,-127)
-
-    #if commands more than deadband then process
-    if abs(commandedX) > 15 or abs(commandedY) > 15 or abs(commandedR) > 15 or self.tick>0:
-      self.compute_strides(commandedX, commandedY, commandedR)
-      numTicks = round(self.duration / self.SERVO_TIME_MS / 6.0) #total ticks divided into the six cases
-      for leg_num in range(0,6):
-        self.compute_amplitudes(leg_num)
-        if self.ripple_case[leg_num] == 1:                               #move foot forward (raise)
-          self.current_X[leg_num] = self.HOME_X[leg_num] - self.amplitudeX*math.cos(self.M_PI*self.tick/(numTicks*2))
-          self.current_Y[leg_num] = self.HOME_Y[leg_num] - self.amplitudeY*math.cos(self.M_PI*self.tick/(numTicks*2))
-          self.current_Z[leg_num] = self.HOME_Z[leg_num] + abs(self.amplitudeZ)*math.sin(self.M_PI*self.tick/(numTicks*2))
-          if self.tick >= numTicks-1:
-            self.ripple_case[leg_num] = 2
-        elif self.ripple_case[leg_num] == 2:                               #move foot forward (lower)
-          self.current_X[leg_num] = self.HOME_X[leg_num] - self.amplitudeX*math.cos(self.M_PI*(numTicks+self.tick)/(numTicks*2))
-          self.current_Y[leg_num] = self.HOME_Y[leg_num] - self.amplitudeY*math.cos(self.M_PI*(numTicks+self.tick)/(numTicks*2))
-          self.current_Z[leg_num] = self.HOME_Z[leg_num] + abs(self.amplitudeZ)*math.sin(self.M_PI*(numTicks+self.tick)/(numTicks*2))
-          if self.tick >= numTicks-1:
-            self.ripple_case[leg_num] = 3
-        elif self.ripple_case[leg_num] == 3:                               #move foot back one-quarter (on the ground)
-          self.current_X[leg_num] = self.current_X[leg_num] - self.amplitudeX/numTicks/2.0
-          self.current_Y[leg_num] = self.current_Y[leg_num] - self.amplitudeY/numTicks/2.0
-          self.current_Z[leg_num] = self.HOME_Z[leg_num]
-          if self.tick >= numTicks-1:
-            self.ripple_case[leg_num] = 4
-        elif self.ripple_case[leg_num] == 4:                               #move foot back one-quarter (on the ground)
-          self.current_X[leg_num] = self.current_X[leg_num] - self.amplitudeX/numTicks/2.0
-          self.current_Y[leg_num] = self.current_Y[leg_num] - self.amplitudeY/numTicks/2.0
-          self.current_Z[leg_num] = self.HOME_Z[leg_num]
-          if self.tick >= numTicks-1:
-            self.ripple_case[leg_num] = 5
-        elif self.ripple_case[leg_num] == 5:                               #move foot back one-quarter (on the ground)
-          self.current_X[leg_num] = self.current_X[leg_num] - self.amplitudeX/numTicks/2.0
-          self.current_Y[leg_num] = self.current_Y[leg_num] - self.amplitudeY/numTicks/2.0
-          self.current_Z[leg_num] = self.HOME_Z[leg_num]
-          if self.tick >= numTicks-1:
-            self.ripple_case[leg_num] = 6
-        elif self.ripple_case[leg_num] == 6:                               #move foot back one-quarter (on the ground)
-          self.current_X[leg_num] = self.current_X[leg_num] - self.amplitudeX/numTicks/2.0
-          self.current_Y[leg_num] = self.current_Y[leg_num] - self.amplitudeY/numTicks/2.0
-          self.current_Z[leg_num] = self.HOME_Z[leg_num]
-          if self.tick >= numTicks-1:
-            self.ripple_case[leg_num] = 1
-
-      #increment tick
-      if self.tick < numTicks-1:
-        self.tick+=1
-      else:
-        self.tick = 0
+    commandedS = map(self.controller.analog(self.AS_SPEED),0,255,127,-127) if self.AS_SPEED else 0   #speed, up is faster
+    return commandedX, commandedY, commandedR, commandedS if abs(commandedS) > self.WALK_DEADBAND else 0
+
+  def walk(self):
+    command = self.read_walk_command()
+    if self.lookahead is not None and self.lookahead.consume(command):
+      return                                          #frame came precomputed from the worker
+    self.step_walk(command, self.clock(), out=self.current)
+
+  def step_walk(self, command, now: float, out: np.ndarray = None):
+    #advance the gait to clock time now, returns (6, 3) foot positions or None when standing.
+    #with out the positions are written there and nothing is allocated once the tables exist
+    commandedX, commandedY, commandedR, commandedS = command
+
+    #if commands more than deadband then process, always finish the current phase
+    commanded = self.walk_commanded(command)
+    if commanded or self.gait_time is not None:
+      definition = self.gaits[self.gait]
+      self.compute_strides(commandedX, commandedY, commandedR, commandedS)
+
+      if self.gait_time is None:
+        self.gait_time = now
+        self.gait_duration = self.duration
+      elapsed = min(now - self.gait_time, self.GAIT_MAX_STEP_S)
+      self.gait_time = now
+      self.gait_duration += (self.duration - self.gait_duration)*min(1.0, elapsed/self.GAIT_SPEED_TAU_S)
+
+      advance = elapsed*1000.0/self.gait_duration
+      phase = self.gait_phase + advance
+      if not commanded:
+        #stop at the end of the current phase slot
+        boundary = math.floor(self.gait_phase*definition.phases + 1)/definition.phases
+        if phase >= boundary:
+          phase = boundary
+          self.gait_time = None
+      self.gait_phase = phase % 1.0
+
+      coefficients = gait.sample_gait(self.gait_table(definition), self.gait_phase, out=self.gait_coefficients)
+      if self.blend < 1.0:
+        self.blend = min(1.0, self.blend + advance/self.GAIT_BLEND_CYCLES)
+        w = self.blend*self.blend*(3.0 - 2.0*self.blend)                 #smoothstep
+        source = gait.sample_gait(self.gait_table(self.blend_from), (self.gait_phase + self.blend_shift) % 1.0,
+                                  out=self.blend_coefficients)
+        coefficients -= source
+        coefficients *= w
+        coefficients += source
+      if out is None:
+        out = np.empty((6, 3))
+      np.multiply(self.amplitudes, coefficients, out=out)
+      out += self.home
+      return out
+    return None
+
+  def walk_commanded(self, command) -> bool:
+    commandedX, commandedY, commandedR, _ = command
+    return abs(commandedX) > self.WALK_DEADBAND or abs(commandedY) > self.WALK_DEADBAND or abs(commandedR) > self.WALK_DEADBAND
+
+  def walk_key(self, command):
+    #everything besides the clock and the exact stick values that decides
+    #the next walking frames, the look-ahead allows the values some drift
+    return (self.walk_commanded(command), self.gait, self.gait_speed, self.step_height_multiplier, self.walk_generation)
+
+  def walk_snapshot(self):
+    #copy for the look-ahead worker: stepping it rebinds the gait state on
+    #the copy only, and the arrays it reads are its own, not the live ones
+    snapshot = copy.copy(self)
+    snapshot.current = self.current.copy()
+    snapshot.offset = self.offset.copy()
+    snapshot.servo_angles = self.servo_angles.copy()
+    snapshot.gait_coefficients = np.zeros((6, 3))
+    snapshot.blend_coefficients = np.zeros((6, 3))
+    return snapshot
 
 
   #***********************************************************************
-  # Tetrapod Gait
-  # Right front and left rear legs move forward together, then right  
-  # rear and left middle, and finally right middle and left front.
+  # Compute walking stride lengths
   #***********************************************************************
-  def tetrapod_gait(self):
-    #read commanded values from controller
-    val_x = self.controller.analog(self.THROTTLE_R) - self.controller.analog(self.THROTTLE_L)
-    commandedY = map(val_x, -255, 255, 127, -127)
-    
-    commandedX = map(self.controller.analog(self.AS_RY),0,255,127,-127) 
-    commandedR = map(self.controller.analog(self.AS_RX),0,255,127,-127)
+  def compute_strides(self, commandedX, commandedY, commandedR, commandedS=0):
+    self.strideX, self.strideY, self.strideR = self.stride_lengths(commandedX, commandedY, commandedR)
+    self.duration = self.cycle_duration(self.gait_speed, commandedS)
 
-    #if commands more than deadband then process
-    if abs(commandedX) > 15 or abs(commandedY) > 15 or abs(commandedR) > 15 or self.tick>0:
-      self.compute_strides(commandedX, commandedY, commandedR)
-      numTicks = round(self.duration / self.SERVO_TIME_MS / 3.0) #total ticks divided into the three cases
-      for leg_num in range(0,6):
-        self.compute_amplitudes(leg_num)
-        if self.tetrapod_case[leg_num] == 1:                               #move foot forward (raise and lower)
-          self.current_X[leg_num] = self.HOME_X[leg_num] - self.amplitudeX*math.cos(self.M_PI*self.tick/numTicks)
-          self.current_Y[leg_num] = self.HOME_Y[leg_num] - self.amplitudeY*math.cos(self.M_PI*self.tick/numTicks)
-          self.current_Z[leg_num] = self.HOME_Z[leg_num] + abs(self.amplitudeZ)*math.sin(self.M_PI*self.tick/numTicks)
-          if self.tick >= numTicks-1:
-            self.tetrapod_case[leg_num] = 2
-          break
-        elif self.tetrapod_case[leg_num] == 2:                               #move foot back one-half (on the ground)
-          self.current_X[leg_num] = self.current_X[leg_num] - self.amplitudeX/numTicks
-          self.current_Y[leg_num] = self.current_Y[leg_num] - self.amplitudeY/numTicks
-          self.current_Z[leg_num] = self.HOME_Z[leg_num]
-          if self.tick >= numTicks-1:
-            self.tetrapod_case[leg_num] = 3
-          break
-        elif self.tetrapod_case[leg_num] == 3:                               #move foot back one-half (on the ground)
-          self.current_X[leg_num] = self.current_X[leg_num] - self.amplitudeX/numTicks
-          self.current_Y[leg_num] = self.current_Y[leg_num] - self.amplitudeY/numTicks
-          self.current_Z[leg_num] = self.HOME_Z[leg_num]
-          if self.tick >= numTicks-1:
-            self.tetrapod_case[leg_num] = 1
-      #increment tick
-      if self.tick < numTicks-1:
-        self.tick+=1
-      else:
-        self.tick = 0
+    #amplitudes only change with the commanded stride
+    amplitude_key = (self.strideX, self.strideY, self.strideR, self.step_height_multiplier)
+    if amplitude_key != self.amplitude_key:
+      self.amplitude_key = amplitude_key
+      self.amplitudes = self.stride_amplitudes(self.strideX, self.strideY, self.strideR, self.step_height_multiplier)
 
+  @staticmethod
+  def stride_lengths(commandedX, commandedY, commandedR):
+    #X and Y stride (mm) and yaw stride (degrees) for a stick command
+    return 90*commandedX/127, 90*commandedY/127, 35*commandedR/127
 
-  #***********************************************************************
-  # Compute walking stride lengths
-  #***********************************************************************
-  def compute_strides(self, commandedX, commandedY, commandedR):
-    #compute stride lengths
-    self.strideX = 90*commandedX/127
-    self.strideY = 90*commandedY/127
-    self.strideR = 35*commandedR/127
-
-    #compute rotation trig
-    self.sinRotZ = math.sin(math.radians(self.strideR))
-    self.cosRotZ = math.cos(math.radians(self.strideR))
-
-    #set duration for normal and slow speed modes
-    if self.gait_speed == 0:
-      self.duration = 1080 
-    else:
-      self.duration = 3240
+  def cycle_duration(self, gait_speed, commandedS=0):
+    #cycle time (ms) for normal and slow speed modes, scaled by the speed axis
+    duration = self.GAIT_CYCLE_MS[0 if gait_speed == 0 else 1]
+    if commandedS:
+      duration /= self.GAIT_SPEED_RANGE**(commandedS/127)
+    return duration
 
 
   #***********************************************************************
   # Compute walking amplitudes
+  # All legs at once, as a (6, 3) array of X, Y and |Z| amplitudes. Pure,
+  # so motion clips can use it without touching the walking state
   #***********************************************************************
-  def compute_amplitudes(self, leg_num: int):
-    #compute total distance from center of body to toe
-    self.totalX = self.HOME_X[leg_num] + self.BODY_X[leg_num]
-    self.totalY = self.HOME_Y[leg_num] + self.BODY_Y[leg_num]
-
-    #compute rotational offset
-    self.rotOffsetX = self.totalY*self.sinRotZ + self.totalX*self.cosRotZ - self.totalX
-    self.rotOffsetY = self.totalY*self.cosRotZ - self.totalX*self.sinRotZ - self.totalY
+  def stride_amplitudes(self, strideX, strideY, strideR, step_height_multiplier):
+    #rotational offset of every toe for the commanded yaw
+    rot_offsets = self.body_rotation_offsets(kinematics.rotation_matrix(0.0, 0.0, math.radians(strideR)))
+    strides_X = strideX + rot_offsets[:, 0]
+    strides_Y = strideY + rot_offsets[:, 1]
 
     #compute X and Y amplitude and constrain to prevent legs from crashing into each other
-    self.amplitudeX = ((self.strideX + self.rotOffsetX)/2.0)
-    self.amplitudeY = ((self.strideY + self.rotOffsetY)/2.0)
-    self.amplitudeX = constrain(self.amplitudeX,-50,50)
-    self.amplitudeY = constrain(self.amplitudeY,-50,50)
-
-    #compute Z amplitude
-    if abs(self.strideX + self.rotOffsetX) > abs(self.strideY + self.rotOffsetY):
-      self.amplitudeZ = self.step_height_multiplier * (self.strideX + self.rotOffsetX) /4.0
-    else:
-      self.amplitudeZ = self.step_height_multiplier * (self.strideY + self.rotOffsetY) / 4.0
+    amplitudes = np.empty((6, 3))
+    amplitudes[:, 0] = np.clip(strides_X/2.0, -50, 50)
+    amplitudes[:, 1] = np.clip(strides_Y/2.0, -50, 50)
+
+    #compute Z amplitude, only its magnitude is used for the step height
+    strides_Z = np.where(np.abs(strides_X) > np.abs(strides_Y), strides_X, strides_Y)
+    amplitudes[:, 2] = np.abs(step_height_multiplier * strides_Z / 4.0)
+    return amplitudes
+
+  def body_rotation_offsets(self, rotation: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    #(6, 3) toe displacements for rotating the body about its center
+    out = np.matmul(self.body_to_toe, rotation.T, out=out)
+    out -= self.body_to_toe
+    return out
         
 
   #***********************************************************************
@@ -749,13 +870,10 @@ class Hexapod:
   # Body rotate with controller (xyz axes)
   #***********************************************************************
   def rotate_control(self):
-    #compute rotation sin/cos values using controller inputs
-    sinRotX = math.sin((map(self.controller.analog(self.AS_RX),0,255,self.A12DEG,-self.A12DEG))/1000000.0)
-    cosRotX = math.cos((map(self.controller.analog(self.AS_RX),0,255,self.A12DEG,-self.A12DEG))/1000000.0)
-    sinRotY = math.sin((map(self.controller.analog(self.AS_RY),0,255,self.A12DEG,-self.A12DEG))/1000000.0)
-    cosRotY = math.cos((map(self.controller.analog(self.AS_RY),0,255,self.A12DEG,-self.A12DEG))/1000000.0)
-    self.sinRotZ = math.sin((map(self.controller.analog(self.AS_LX),0,255,-self.A30DEG,self.A30DEG))/1000000.0)
-    self.cosRotZ = math.cos((map(self.controller.analog(self.AS_LX),0,255,-self.A30DEG,self.A30DEG))/1000000.0)
+    #compute rotation angles using controller inputs
+    rotX = map(self.controller.analog(self.AS_RX),0,255,self.A12DEG,-self.A12DEG)/1000000.0
+    rotY = map(self.controller.analog(self.AS_RY),0,255,self.A12DEG,-self.A12DEG)/1000000.0
+    rotZ = map(self.controller.analog(self.AS_LX),0,255,-self.A30DEG,self.A30DEG)/1000000.0
 
     #compute Z direction move
     self.translateZ = self.controller.analog(self.AS_LY)
@@ -764,35 +882,19 @@ class Hexapod:
     else:
       self.translateZ = map(self.translateZ,0,127,-3*self.TRAVEL,0)    
 
-    for leg_num in range(0,6):
-      #compute total distance from center of body to toe
-      self.totalX = self.HOME_X[leg_num] + self.BODY_X[leg_num]
-      self.totalY = self.HOME_Y[leg_num] + self.BODY_Y[leg_num]
-      self.totalZ = self.HOME_Z[leg_num] + self.BODY_Z[leg_num]
-
-      #perform 3 axis rotations
-      self.rotOffsetX =  self.totalX*cosRotY*self.cosRotZ + self.totalY*sinRotX*sinRotY*self.cosRotZ + self.totalY*cosRotX*self.sinRotZ - self.totalZ*cosRotX*sinRotY*self.cosRotZ + self.totalZ*sinRotX*self.sinRotZ - self.totalX
-      self.rotOffsetY = -self.totalX*cosRotY*self.sinRotZ - self.totalY*sinRotX*sinRotY*self.sinRotZ + self.totalY*cosRotX*self.cosRotZ + self.totalZ*cosRotX*sinRotY*self.sinRotZ + self.totalZ*sinRotX*self.cosRotZ - self.totalY
-      self.rotOffsetZ =  self.totalX*sinRotY         - self.totalY*sinRotX*cosRotY                                  + self.totalZ*cosRotX*cosRotY                                  - self.totalZ
-
-      # Calculate foot positions to achieve desired rotation
-      self.current_X[leg_num] = self.HOME_X[leg_num] + self.rotOffsetX
-      self.current_Y[leg_num] = self.HOME_Y[leg_num] + self.rotOffsetY
-      self.current_Z[leg_num] = self.HOME_Z[leg_num] + self.rotOffsetZ + self.translateZ
-
-      #lock in offsets if commanded
-      if self.capture_offsets == True:
-        self.offset_X[leg_num] = self.offset_X[leg_num] + self.rotOffsetX
-        self.offset_Y[leg_num] = self.offset_Y[leg_num] + self.rotOffsetY
-        self.offset_Z[leg_num] = self.offset_Z[leg_num] + self.rotOffsetZ + self.translateZ
-        self.current_X[leg_num] = self.HOME_X[leg_num]
-        self.current_Y[leg_num] = self.HOME_Y[leg_num]
-        self.current_Z[leg_num] = self.HOME_Z[leg_num]
+    #perform 3 axis rotations of all toes at once
+    rot_offsets = self.body_rotation_offsets(kinematics.rotation_matrix(rotX, rotY, rotZ), out=self.rot_offsets)
+    rot_offsets[:, 2] += self.translateZ
 
-    #if offsets were commanded, exit current mode
     if self.capture_offsets == True:
+      #lock in offsets and exit current mode
+      self.offset += rot_offsets
+      self.current[:] = self.home
       self.capture_offsets = False
       self.set_mode(self.MODE_IDLE)
+    else:
+      # Calculate foot positions to achieve desired rotation
+      np.add(self.home, rot_offsets, out=self.current)
 
 
   #***********************************************************************
@@ -800,49 +902,49 @@ class Hexapod:
   # also can set z step height using capture offsets
   #***********************************************************************
   def one_leg_lift(self):
-    #read current leg servo 1 positions the first time
+    #manual angles go through servo_angles like IK output, flush_servos writes them
+
+    #start leg 1 from the angles IK commanded last the first time
     if self.leg1_IK_control == True:
-      self.leg1_coxa  = self.coxa1_servo.read() 
-      self.leg1_femur = self.femur1_servo.read() 
-      self.leg1_tibia = self.tibia1_servo.read() 
+      self.leg1_coxa, self.leg1_femur, self.leg1_tibia = self.servo_angles[0].tolist()
       self.leg1_IK_control = False
 
-    #read current leg servo 6 positions the first time
+    #start leg 6 from the angles IK commanded last the first time
     if self.leg6_IK_control == True:
-      self.leg6_coxa  = self.coxa6_servo.read() 
-      self.leg6_femur = self.femur6_servo.read() 
-      self.leg6_tibia = self.tibia6_servo.read() 
+      self.leg6_coxa, self.leg6_femur, self.leg6_tibia = self.servo_angles[5].tolist()
       self.leg6_IK_control = False
 
     #process right joystick left/right axis
     self.temp = self.controller.analog(self.AS_RX)
     self.temp = map(self.temp,0,255,45,-45)
-    self.coxa1_servo.write(constrain(int(self.leg1_coxa+self.temp),45,135))
+    self.servo_angles[0, 0] = constrain(int(self.leg1_coxa+self.temp),45,135)
 
     #process right joystick up/down axis
     self.temp = self.controller.analog(self.AS_RY)
     if self.temp < 117:                                #if joystick moved up
       self.temp = map(self.temp,116,0,0,24)                #move leg 1
-      self.femur1_servo.write(constrain(int(self.leg1_femur+self.temp),0,170))
-      self.tibia1_servo.write(constrain(int(self.leg1_tibia+4*self.temp),0,170))
+      self.servo_angles[0, 1] = constrain(int(self.leg1_femur+self.temp),0,170)
+      self.servo_angles[0, 2] = constrain(int(self.leg1_tibia+4*self.temp),0,170)
     else:                                          #if joystick moved down
       self.z_height_right = constrain(self.temp,140,255)   #set Z step height
       self.z_height_right = map(self.z_height_right,140,255,1,8)
+    self.servo_pending[0] = True
 
     #process left joystick left/right axis
     self.temp = self.controller.analog(self.AS_LX)
     self.temp = map(self.temp,0,255,45,-45)
-    self.coxa6_servo.write(constrain(int(self.leg6_coxa+self.temp),45,135))
+    self.servo_angles[5, 0] = constrain(int(self.leg6_coxa+self.temp),45,135)
 
     #process left joystick up/down axis
     self.temp = self.controller.analog(self.AS_LY)
     if self.temp < 117:                                #if joystick moved up
       self.temp = map(self.temp,116,0,0,24)                #move leg 6
-      self.femur6_servo.write(constrain(int(self.leg6_femur+self.temp),0,170))
-      self.tibia6_servo.write(constrain(int(self.leg6_tibia+4*self.temp),0,170))
+      self.servo_angles[5, 1] = constrain(int(self.leg6_femur+self.temp),0,170)
+      self.servo_angles[5, 2] = constrain(int(self.leg6_tibia+4*self.temp),0,170)
     else:                                          #if joystick moved down
       self.z_height_left = constrain(self.temp,140,255)    #set Z step height
       self.z_height_left = map(self.z_height_left,140,255,1,8)
+    self.servo_pending[5] = True
 
     #process z height adjustment
     if self.z_height_left>self.z_height_right: 
@@ -859,29 +961,9 @@ class Hexapod:
   #      constants section above so all angles appear as 90 degrees
   #***********************************************************************
   def set_all_90(self):
-    self.coxa1_servo.write(90+self.COXA_CAL[0]) 
-    self.femur1_servo.write(90+self.FEMUR_CAL[0]) 
-    self.tibia1_servo.write(90+self.TIBIA_CAL[0]) 
-    
-    self.coxa2_servo.write(90+self.COXA_CAL[1]) 
-    self.femur2_servo.write(90+self.FEMUR_CAL[1]) 
-    self.tibia2_servo.write(90+self.TIBIA_CAL[1]) 
-    
-    self.coxa3_servo.write(90+self.COXA_CAL[2]) 
-    self.femur3_servo.write(90+self.FEMUR_CAL[2]) 
-    self.tibia3_servo.write(90+self.TIBIA_CAL[2]) 
-    
-    self.coxa4_servo.write(90+self.COXA_CAL[3]) 
-    self.femur4_servo.write(90+self.FEMUR_CAL[3]) 
-    self.tibia4_servo.write(90+self.TIBIA_CAL[3]) 
-    
-    self.coxa5_servo.write(90+self.COXA_CAL[4]) 
-    self.femur5_servo.write(90+self.FEMUR_CAL[4]) 
-    self.tibia5_servo.write(90+self.TIBIA_CAL[4]) 
-    
-    self.coxa6_servo.write(90+self.COXA_CAL[5]) 
-    self.femur6_servo.write(90+self.FEMUR_CAL[5]) 
-    self.tibia6_servo.write(90+self.TIBIA_CAL[5])
+    #replaces any IK angles not yet written, flush_servos outputs them
+    self.servo_angles[:] = 90 + self.cal_array
+    self.servo_pending[:] = [True] * 6
 
 
 
@@ -889,28 +971,55 @@ class Hexapod:
   # Print Debug Data
   #***********************************************************************
   def print_debug(self):
-    #display elapsed frame time (ms) and battery voltage (V)
+    #display measured kinematics frame period (ms) and battery voltage (V)
     if self.n_cycles % 1000 == 0:
-      self.currentTime = self.get_current_time_ms()
-      logger.debug("%s, %s",self.currentTime-self.previousTime,float(self.batt_voltage)/100.0)
+      rate = self.rates["kinematics"].rate
+      logger.debug("%.2f, %s", 1000.0/rate if rate else 0.0, float(self.batt_voltage)/100.0)
+      logger.debug("IK leg solves %s, skipped %s", self.ik_solves, self.ik_skipped)
+      logger.debug("IK out of reach: %s legs this frame, %s leg-frames total", int(self.leg_clamped.sum()), self.ik_clamped)
+      if isinstance(self.ik, CachedIK):
+        logger.debug("IK cache hits %s, misses %s (%.1f%%)", self.ik.hits, self.ik.misses, 100*self.ik.hit_rate)
+      if self.lookahead is not None:
+        logger.debug("Look-ahead frames used %s, computed live %s", self.lookahead.hits, self.lookahead.misses)
+      if self.realtime is not None:
+        logger.debug("GC runs in slack %s, deferred %s", self.realtime.gc_runs, self.realtime.gc_deferred)
+      logger.debug("Loop rates: %s", self.rate_report())
 
   def set_mode(self, mode_id: int) -> None:
     if self.mode != mode_id:
       logger.info("%s mode applied", self.mode_id_to_name.get(mode_id))
+      if self.mode == self.MODE_CALI:
+        self.clips.compile_async(self)          #rebuild for the new calibration off the loop
       if mode_id == 1:
         logger.info("%s gait applied", self.gait_id_to_name.get(self.gait))
       self.mode = mode_id
+      self.gait_time = None
+      self.blend = 1.0
+      self.walk_generation += 1
+      self.invalidate_legs()
     
   def set_gait(self, gait_id: int) -> None:
+    if gait_id not in self.gaits:
+      logger.warning("Gait %s not defined", gait_id)
+      return
     if self.gait != gait_id:
-      logger.info("%s gait selected (but not applied)", self.gait_id_to_name.get(gait_id))
+      if self.gait_time is not None:
+        #walking: continue from the closest phase of the new gait and blend into it
+        source = self.gaits[self.gait]
+        phase = gait.plan_transition(source, self.gaits[gait_id], self.gait_phase)
+        logger.info("%s gait applied, blending from %s", self.gait_id_to_name.get(gait_id), source.name)
+        self.blend_from = source
+        self.blend_shift = self.gait_phase - phase
+        self.blend = 0.0
+        self.gait_phase = phase
+      else:
+        logger.info("%s gait selected (but not applied)", self.gait_id_to_name.get(gait_id))
+        self.gait_phase = 0.0
+        self.blend = 1.0
       self.gait = gait_id
+      self.walk_generation += 1
 
 
-  @staticmethod
-  def get_current_time_ms():
-    return round(time.time() * 1000)
-
   def reload_config(self):
     if not os.path.exists(self.config_file_path):
       logger.warning("Config file not found. Wirting default values to %s", self.config_file_path)
@@ -927,7 +1036,52 @@ class Hexapod:
       self.COXA_CAL = config["COXA_CAL"]
       self.FEMUR_CAL = config["FEMUR_CAL"]
       self.TIBIA_CAL = config["TIBIA_CAL"]
-
+      self.gait_config = config.get("GAITS", [])
+      self.clip_buttons = config.get("CLIP_BUTTONS", {})
+      self.choreography_config = config.get("CHOREOGRAPHIES", [])
+    self.update_cal_array()
+    self.update_gaits()
+    self.update_choreographies()
+
+  def update_gaits(self):
+    #built-in gaits plus the ones from the GAITS list of the config.
+    #each entry: {"id", "name", "phases", "duty", "offsets", optional "swing", "stance", "pad"}
+    self.gaits = dict(self.GAITS)
+    self.gait_pads = {
+      self.PAD_DOWN: self.GAIT_TRIP,
+      self.PAD_LEFT: self.GAIT_WAVE,
+      self.PAD_UP: self.GAIT_RIPP,
+      self.PAD_RIGHT: self.GAIT_TETR
+    }
+    self.gaits.update(gait.load_gaits(self.gait_config))
+    for entry in self.gait_config:
+      if "pad" in entry:
+        self.gait_pads[entry["pad"]] = int(entry["id"])
+    self.gait_id_to_name = {gait_id: definition.name for gait_id, definition in self.gaits.items()}
+    #compile every table the walk can use up front, see gait_table and set_gait
+    self.gait_tables = {definition: gait.compile_gait(definition, self.GAIT_TABLE_TICKS)
+                        for definition in self.gaits.values()}
+    for definition in self.gaits.values():
+      gait.compile_gait(definition, gait.TRANSITION_SAMPLES)
+
+  def update_choreographies(self):
+    #choreographies from the config become computed motion clips, see choreography.py
+    for entry in self.choreography_config:
+      definition = choreography.Choreography.from_config(entry)
+      self.clips.register(definition.name,
+                          lambda robot, gait_speed, definition=definition: choreography.choreography_targets(robot, definition),
+                          json.dumps(entry, sort_keys=True))
+
+  def compile_clips(self):
+    #every clip ahead of time, so playing one never builds it in the loop
+    self.clips.compile(self)
+
+  def update_cal_array(self):
+    self.cal_array = np.array([self.COXA_CAL, self.FEMUR_CAL, self.TIBIA_CAL], dtype=np.float64).T
+    self.cal_rows = self.cal_array.tolist()     #per leg (coxa, femur, tibia), for legs_IK_scalar
+    self.clips.clear()                          #computed clips depend on calibration, see set_mode
+    self.walk_generation += 1
+    self.invalidate_legs()
 
   def write_config(self):
     config = {
@@ -935,5 +1089,12 @@ class Hexapod:
         "FEMUR_CAL": self.FEMUR_CAL,
         "TIBIA_CAL": self.TIBIA_CAL
     }
+    if self.gait_config:
+      config["GAITS"] = self.gait_config
+    if self.clip_buttons:
+      config["CLIP_BUTTONS"] = self.clip_buttons
+    if self.choreography_config:
+      config["CHOREOGRAPHIES"] = self.choreography_config
     with open(self.config_file_path, 'wt') as f:
       f.write(json.dumps(config, indent=4))
+    self.update_cal_array()
@@ -0,0 +1,76 @@
+#***********************************************************************
+# Memoized IK
+# Wraps any IK backend with a bounded LRU cache keyed on the foot target
+# quantized to a fixed resolution. Poses held still (home, translate or
+# rotate with the stick steady, calibration) revisit the same targets.
+# Walking mostly does not: the gait phase follows the clock, so loop
+# jitter puts the feet on new targets every cycle (hit rate about 0.4
+# at +-0.5 ms), and a miss costs more than solving without the cache.
+# Worth it in front of a slow backend with mostly static poses only.
+#***********************************************************************
+import logging
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class CachedIK:
+
+    def __init__(self, backend, resolution: float = 0.1, max_size: int = 4096):
+        self.backend = backend
+        self.resolution = resolution        #quantization step in mm
+        self.max_size = max_size
+        self.cache: OrderedDict = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits/total if total else 0.0
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+    def solve(self, targets: np.ndarray,
+              legs: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Same contract as AnalyticIK.solve, answered from the cache where possible.
+
+        Misses are solved at the quantized target, so a key always maps to
+        the same angles regardless of which target filled it.
+        """
+        if legs is None:
+            legs = np.broadcast_to(np.arange(targets.shape[-2]), targets.shape[:-1])
+        quantized = np.round(targets.reshape(-1, 3)/self.resolution).astype(np.int64)
+        leg_ids = np.asarray(legs).reshape(-1)
+
+        cache = self.cache
+        keys = list(zip(leg_ids.tolist(), *quantized.T.tolist()))
+        joints = np.empty(quantized.shape, dtype=np.float64)
+        valid = np.empty(len(quantized), dtype=bool)
+        missing = []
+        for i, key in enumerate(keys):
+            entry = cache.get(key)
+            if entry is None:
+                missing.append(i)
+                continue
+            cache.move_to_end(key)
+            joints[i], valid[i] = entry
+
+        self.hits += len(quantized) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            missing = np.array(missing)
+            solved, solved_valid = self.backend.solve(
+                quantized[missing]*self.resolution, leg_ids[missing])
+            joints[missing] = solved
+            valid[missing] = solved_valid
+            for i, j, v in zip(missing.tolist(), solved.tolist(), solved_valid.tolist()):
+                cache[keys[i]] = (j, v)
+            while len(cache) > self.max_size:
+                cache.popitem(last=False)
+
+        return joints.reshape(targets.shape), valid.reshape(targets.shape[:-1])
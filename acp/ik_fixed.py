@@ -0,0 +1,124 @@
+#***********************************************************************
+# Fixed-point IK backend
+# Integer-only leg IK for low-end boards where float trig in CPython
+# dominates the frame. Lengths are in 1/16 mm, angles in 1/64 degree,
+# square roots are integer and acos/atan come from precomputed tables
+# with linear interpolation. Servo commands match AnalyticIK within
+# +-1 degree (Servo.write truncates to whole degrees anyway) for targets
+# at least 1 mm inside the reach limits and 5 mm off the coxa axis;
+# closer than that the 1/16 mm input quantization shows through.
+#***********************************************************************
+import math
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from kinematics import RAD_TO_DEG
+
+try:
+    from math import isqrt
+except ImportError:                     #python < 3.8
+    def isqrt(n: int) -> int:
+        if n <= 0:
+            return 0
+        x = 1 << ((n.bit_length() + 1) >> 1)
+        while True:
+            y = (x + n//x) >> 1
+            if y >= x:
+                return x
+            x = y
+
+logger = logging.getLogger(__name__)
+
+LENGTH_SCALE = 16               #fixed-point units per mm
+ANGLE_SCALE = 64                #fixed-point units per degree
+
+ACOS_SIZE = 8192                #table steps over [-1, 1]
+ATAN_SIZE = 1024                #table steps over [0, 1]
+
+_ACOS: List[int] = [round(math.acos(min(1.0, 2.0*i/ACOS_SIZE - 1.0))*RAD_TO_DEG*ANGLE_SCALE)
+                    for i in range(ACOS_SIZE + 1)]
+_ATAN: List[int] = [round(math.atan(i/ATAN_SIZE)*RAD_TO_DEG*ANGLE_SCALE)
+                    for i in range(ATAN_SIZE + 1)]
+
+_A90 = 90*ANGLE_SCALE
+_A180 = 180*ANGLE_SCALE
+
+
+def acos_fixed(num: int, den: int) -> int:
+    """acos(num/den) in fixed-point degrees, den > 0. Ratio is clamped to [-1, 1]."""
+    idx, rem = divmod((num + den)*ACOS_SIZE, 2*den)
+    if idx < 0:
+        return _ACOS[0]
+    if idx >= ACOS_SIZE:
+        return _ACOS[ACOS_SIZE]
+    lo = _ACOS[idx]
+    return lo + (_ACOS[idx + 1] - lo)*rem//(2*den)
+
+
+def _atan_fixed(num: int, den: int) -> int:
+    #atan(num/den) for 0 <= num <= den, den > 0
+    idx, rem = divmod(num*ATAN_SIZE, den)
+    if idx >= ATAN_SIZE:
+        return _ATAN[ATAN_SIZE]
+    lo = _ATAN[idx]
+    return lo + (_ATAN[idx + 1] - lo)*rem//den
+
+
+def atan2_fixed(y: int, x: int) -> int:
+    """atan2(y, x) in fixed-point degrees, range (-180, 180]."""
+    ax = abs(x)
+    ay = abs(y)
+    if ax == 0 and ay == 0:
+        return 0
+    if ay <= ax:
+        a = _atan_fixed(ay, ax)
+    else:
+        a = _A90 - _atan_fixed(ax, ay)
+    if x < 0:
+        a = _A180 - a
+    return -a if y < 0 else a
+
+
+class FixedPointIK:
+
+    def __init__(self, coxa_length: float, femur_length: float, tibia_length: float):
+        self.coxa_length = coxa_length
+        self.femur_length = femur_length
+        self.tibia_length = tibia_length
+
+        self.coxa = round(coxa_length*LENGTH_SCALE)
+        self.femur = round(femur_length*LENGTH_SCALE)
+        self.tibia = round(tibia_length*LENGTH_SCALE)
+        self.femur2 = self.femur*self.femur
+        self.tibia2 = self.tibia*self.tibia
+        self.max_reach2 = (self.tibia + self.femur)**2
+        self.min_reach2 = (self.tibia - self.femur)**2
+        self.tibia_den = 2*self.femur*self.tibia
+
+    def solve_leg(self, X: int, Y: int, Z: int) -> Tuple[int, int, int, bool]:
+        """Fixed-point (coxa, femur, tibia) for a fixed-point target, plus reach flag."""
+        L0 = isqrt(X*X + Y*Y) - self.coxa
+        L3_2 = L0*L0 + Z*Z
+        if not self.min_reach2 < L3_2 < self.max_reach2:
+            return 0, 0, 0, False
+        L3 = isqrt(L3_2)
+
+        phi_tibia = acos_fixed(self.femur2 + self.tibia2 - L3_2, self.tibia_den)
+        phi_femur = acos_fixed(self.femur2 + L3_2 - self.tibia2, 2*self.femur*L3)
+        gamma_femur = atan2_fixed(Z, L0)
+        return atan2_fixed(X, Y), phi_femur + gamma_femur, phi_tibia, True
+
+    def solve(self, targets: np.ndarray,
+              legs: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Same contract as AnalyticIK.solve; the math is integer-only."""
+        rows = np.rint(targets.reshape(-1, 3)*LENGTH_SCALE).astype(np.int64).tolist()
+        joints = []
+        valid = []
+        for X, Y, Z in rows:
+            coxa, femur, tibia, ok = self.solve_leg(X, Y, Z)
+            joints.append((coxa, femur, tibia))
+            valid.append(ok)
+        joints = np.array(joints, dtype=np.float64).reshape(targets.shape)/ANGLE_SCALE
+        return joints, np.array(valid, dtype=bool).reshape(targets.shape[:-1])
@@ -0,0 +1,173 @@
+#***********************************************************************
+# Lookup table IK backend
+# Joint angles are precomputed over a regular X/Y/Z grid covering the
+# leg workspace and answered by trilinear interpolation, so the hot loop
+# does no trig. The grid is stored as a memory-mapped .npy file keyed by
+# a hash of the leg geometry and reused across restarts.
+#
+# Accuracy bound (4 mm grid, 51/65/121 mm legs), max servo degrees vs
+# AnalyticIK for targets within +-60 mm X/Y of home, Z in [-170, 30] mm
+# and at least 5 mm inside the reach limits:
+#   coxa < 0.2, femur < 0.7, tibia < 0.7
+# i.e. below the 1 degree servo resolution. Within 5 mm of full
+# extension/retraction acos gets steep and the error rises to ~8 deg.
+# Run `python ik_table.py` to re-measure for another geometry or grid.
+#
+# Cost: this is NOT a speed option. The eight grid corners of all legs
+# are fetched in one gather, but for six legs NumPy's per-call overhead
+# dominates, and in batches the scattered reads lose to vectorized trig.
+# Measured on the development machine (python benchmark.py ik-loop / ik):
+#   live legs_IK   table ~120-150 us/frame, analytic ~40-45 us/frame
+#   batched solve  table ~0.85 M leg solves/s, analytic ~9 M
+# Use it only where trig is unavailable or slower than memory reads.
+#***********************************************************************
+import os
+import json
+import hashlib
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+
+import kinematics
+
+logger = logging.getLogger(__name__)
+
+
+class TableIK:
+
+    VERSION = 1
+
+    X_RANGE = (-240.0, 240.0)        #grid bounds (mm), coxa-to-toe frame
+    Y_RANGE = (-240.0, 240.0)
+    Z_RANGE = (-200.0, 80.0)
+
+    # coxa (front branch), coxa (rear branch, [0, 360)), femur, tibia
+    CHANNELS = 4
+
+    def __init__(self, coxa_length: float, femur_length: float, tibia_length: float,
+                 resolution: float = 4.0, cache_dir: Optional[str] = None):
+        self.coxa_length = coxa_length
+        self.femur_length = femur_length
+        self.tibia_length = tibia_length
+        self.resolution = resolution
+        self.cache_dir = cache_dir or os.path.expanduser("~/.cache/arr")
+
+        self.origin = np.array([self.X_RANGE[0], self.Y_RANGE[0], self.Z_RANGE[0]])
+        self.shape = tuple(
+            int(round((hi - lo)/resolution)) + 1
+            for lo, hi in (self.X_RANGE, self.Y_RANGE, self.Z_RANGE))
+        self.max_index = np.array(self.shape) - 2
+        self.path = os.path.join(self.cache_dir, f"ik_table_{self.geometry_key()}.npy")
+        self.table = self._load_or_build()
+        #plain ndarray view of the memmap, indexing a memmap subclass costs a Python hook per result
+        self.flat = np.asarray(self.table).reshape(-1, self.CHANNELS)
+        self.strides = (self.shape[1]*self.shape[2], self.shape[2])
+        self.corner_offsets = (np.arange(2)[:, None, None] + np.arange(2)[None, :, None]*self.strides[1]
+                               + np.arange(2)[None, None, :]*self.strides[0]).ravel()
+
+    def geometry_key(self) -> str:
+        geometry = {
+            "version": self.VERSION,
+            "lengths": [self.coxa_length, self.femur_length, self.tibia_length],
+            "ranges": [self.X_RANGE, self.Y_RANGE, self.Z_RANGE],
+            "resolution": self.resolution,
+        }
+        return hashlib.sha1(json.dumps(geometry, sort_keys=True).encode()).hexdigest()[:16]
+
+    def _load_or_build(self) -> np.ndarray:
+        if not os.path.exists(self.path):
+            self._build()
+        logger.info("Loading IK table from %s", self.path)
+        table = np.load(self.path, mmap_mode="r")
+        if table.shape != self.shape + (self.CHANNELS,):
+            raise ValueError(f"IK table {self.path} has unexpected shape {table.shape}")
+        return table
+
+    def _build(self) -> None:
+        logger.info("Building IK table %s, grid %s", self.path, self.shape)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        table = np.lib.format.open_memmap(
+            tmp_path, mode="w+", dtype=np.float32, shape=self.shape + (self.CHANNELS,))
+        ys = self.origin[1] + np.arange(self.shape[1])*self.resolution
+        zs = self.origin[2] + np.arange(self.shape[2])*self.resolution
+        targets = np.empty((self.shape[1], self.shape[2], 3))
+        targets[..., 1] = ys[:, None]
+        targets[..., 2] = zs[None, :]
+        for ix in range(self.shape[0]):            #one X slice at a time to bound memory
+            targets[..., 0] = self.origin[0] + ix*self.resolution
+            joints, _ = kinematics.solve_joints(
+                targets, self.coxa_length, self.femur_length, self.tibia_length)
+            table[ix, ..., 0] = joints[..., 0]
+            table[ix, ..., 1] = np.where(joints[..., 0] < 0, joints[..., 0] + 360.0, joints[..., 0])
+            table[ix, ..., 2] = joints[..., 1]
+            table[ix, ..., 3] = joints[..., 2]
+        table.flush()
+        del table
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def solve(self, targets: np.ndarray,
+              legs: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Interpolated joint angles, same contract as AnalyticIK.solve."""
+        p = (targets - self.origin)/self.resolution
+        i0 = np.clip(np.floor(p).astype(np.intp), 0, self.max_index)
+        f = np.clip(p - i0, 0.0, 1.0)
+        ix, iy, iz = i0[..., 0], i0[..., 1], i0[..., 2]
+        fx, fy, fz = f[..., 0:1], f[..., 1:2], f[..., 2:3]
+
+        #all eight corners of every target in one gather, weighted in z, y, x order like corner_offsets
+        corners = self.flat[(ix*self.strides[0] + iy*self.strides[1] + iz)[..., None] + self.corner_offsets]
+        wx = np.concatenate((1 - fx, fx), axis=-1)
+        wy = np.concatenate((1 - fy, fy), axis=-1)
+        wz = np.concatenate((1 - fz, fz), axis=-1)
+        weights = (wz[..., :, None, None]*wy[..., None, :, None]*wx[..., None, None, :]).reshape(targets.shape[:-1] + (1, 8))
+        c = (weights @ corners)[..., 0, :]
+
+        joints = np.empty(targets.shape, dtype=np.float64)
+        wrap = kinematics.COXA_WRAP if legs is None else kinematics.COXA_WRAP[legs]
+        joints[..., 0] = np.where(wrap, c[..., 1], c[..., 0])
+        joints[..., 1] = c[..., 2]
+        joints[..., 2] = c[..., 3]
+
+        #reach test is exact (no trig), grid bounds limit it further
+        X = targets[..., 0]
+        Y = targets[..., 1]
+        Z = targets[..., 2]
+        L0 = np.sqrt(X*X + Y*Y) - self.coxa_length
+        L3 = np.sqrt(L0*L0 + Z*Z)
+        valid = (L3 < self.tibia_length + self.femur_length) & (L3 > self.tibia_length - self.femur_length)
+        valid &= (Z >= self.Z_RANGE[0]) & (Z <= self.Z_RANGE[1])
+        return joints, valid
+
+
+def measure_error(table: TableIK, home: np.ndarray, cal: np.ndarray,
+                  samples: int = 20000, margin: float = 5.0, seed: int = 0) -> np.ndarray:
+    """Max abs servo-degree error per joint against AnalyticIK near home.
+
+    Targets closer than margin (mm) to the reach limits are excluded.
+    """
+    rng = np.random.default_rng(seed)
+    targets = np.repeat(home[None], samples, axis=0)
+    targets[..., 0:2] += rng.uniform(-60.0, 60.0, size=(samples, 6, 2))
+    targets[..., 2] = rng.uniform(-170.0, 30.0, size=(samples, 6))
+    analytic = kinematics.AnalyticIK(table.coxa_length, table.femur_length, table.tibia_length)
+    ref, _ = analytic.solve(targets)
+    got, _ = table.solve(targets)
+    err = np.abs(kinematics.joints_to_servo(got, cal) - kinematics.joints_to_servo(ref, cal))
+
+    L0 = np.linalg.norm(targets[..., 0:2], axis=-1) - table.coxa_length
+    L3 = np.hypot(L0, targets[..., 2])
+    inner = ((L3 < table.tibia_length + table.femur_length - margin)
+             & (L3 > table.tibia_length - table.femur_length + margin))
+    return err[inner].max(axis=0)
+
+
+if __name__ == "__main__":
+    from hexapod import Hexapod
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s][%(name)s] %(message)s")
+    table = TableIK(Hexapod.COXA_LENGTH, Hexapod.FEMUR_LENGTH, Hexapod.TIBIA_LENGTH)
+    home = np.array([Hexapod.HOME_X, Hexapod.HOME_Y, Hexapod.HOME_Z]).T
+    logger.info("Max servo error (coxa, femur, tibia): %s", measure_error(table, home, np.zeros((6, 3))))
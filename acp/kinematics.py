@@ -0,0 +1,288 @@
+#***********************************************************************
+# Batched leg kinematics
+# The original per-leg IK math, evaluated for all legs in one NumPy
+# pass (one leg at a time: see solve_leg), plus the matching forward
+# kinematics. Arrays are shaped (..., 6, 3) where the last axis is
+# (X, Y, Z) for targets and (coxa, femur, tibia) for angles.
+#***********************************************************************
+import math
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RAD_TO_DEG = 57.29577951
+
+FEMUR_OFFSET = 14.0             #femur/tibia horn offsets in degrees
+TIBIA_OFFSET = -23.0
+
+# Coxa mounting compensation. Rear legs need different offsets
+# for positive and negative atan2 results.
+COXA_MOUNT_POS = np.array([45.0, 90.0, 135.0, -135.0, -90.0, -45.0])
+COXA_MOUNT_NEG = np.array([45.0, 90.0, 135.0,  225.0, 270.0, 315.0])
+COXA_MOUNT_POS_LIST = COXA_MOUNT_POS.tolist()   #for the scalar leg_to_servo
+COXA_MOUNT_NEG_LIST = COXA_MOUNT_NEG.tolist()
+
+# Legs whose coxa works around atan2's +-180 branch cut. Any coxa value
+# congruent mod 360 gives the same servo angle for these legs.
+COXA_WRAP = COXA_MOUNT_NEG != COXA_MOUNT_POS
+
+
+def solve_joints(targets: np.ndarray, coxa_length: float, femur_length: float,
+                 tibia_length: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Raw joint angles (degrees, no mounting/calibration) for foot targets.
+
+    Returns (joints, valid) where valid marks targets within leg reach.
+    Joints of unreachable targets are finite but meaningless.
+    """
+    X = targets[..., 0]
+    Y = targets[..., 1]
+    Z = targets[..., 2]
+
+    #compute target femur-to-toe (L3) length
+    L0 = np.sqrt(X*X + Y*Y) - coxa_length
+    L3 = np.sqrt(L0*L0 + Z*Z)
+    valid = (L3 < tibia_length + femur_length) & (L3 > tibia_length - femur_length)
+
+    femur2 = femur_length*femur_length
+    tibia2 = tibia_length*tibia_length
+    L3_2 = L3*L3
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cos_tibia = (femur2 + tibia2 - L3_2)/(2*femur_length*tibia_length)
+        cos_femur = (femur2 + L3_2 - tibia2)/(2*femur_length*L3)
+    phi_tibia = np.arccos(np.clip(cos_tibia, -1.0, 1.0))
+    phi_femur = np.arccos(np.clip(np.nan_to_num(cos_femur), -1.0, 1.0))
+    gamma_femur = np.arctan2(Z, L0)
+
+    joints = np.empty(targets.shape, dtype=np.float64)
+    joints[..., 0] = np.arctan2(X, Y)*RAD_TO_DEG
+    joints[..., 1] = (phi_femur + gamma_femur)*RAD_TO_DEG
+    joints[..., 2] = phi_tibia*RAD_TO_DEG
+    return joints, valid
+
+
+def clamp_to_reach(targets: np.ndarray, coxa_length: float, femur_length: float,
+                   tibia_length: float, margin: float = 0.5) -> Tuple[np.ndarray, np.ndarray]:
+    """Project unreachable targets onto the nearest reachable point.
+
+    A leg reaches the annulus TIBIA-FEMUR < L3 < TIBIA+FEMUR in its own
+    (L0, Z) plane, so the nearest reachable point keeps the coxa angle and
+    scales (L0, Z) radially to margin (mm) inside the limits. Returns
+    (targets, clamped) where clamped marks the out-of-reach rows.
+    """
+    X = targets[..., 0]
+    Y = targets[..., 1]
+    Z = targets[..., 2]
+    r = np.sqrt(X*X + Y*Y)
+    L0 = r - coxa_length
+    L3 = np.sqrt(L0*L0 + Z*Z)
+    clamped = ~((L3 < tibia_length + femur_length) & (L3 > tibia_length - femur_length))
+    if not clamped.any():
+        return targets, clamped
+
+    targets = targets.copy()
+    L3c = L3[clamped]
+    L0c = np.where(L3c > 0, L0[clamped], 0.0)
+    Zc = np.where(L3c > 0, Z[clamped], -1.0)          #degenerate: reach straight down
+    L3c = np.where(L3c > 0, L3c, 1.0)
+    scale = np.clip(L3c, tibia_length - femur_length + margin, tibia_length + femur_length - margin)/L3c
+    rc = r[clamped]
+    r_new = L0c*scale + coxa_length
+    #targets tucked in behind the coxa axis have no projection that keeps
+    #the coxa angle; leave them as they are so the leg holds its position
+    ok = (rc > 0) & (r_new >= 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(ok, r_new/rc, 1.0)
+    targets[clamped, 0] = X[clamped]*ratio
+    targets[clamped, 1] = Y[clamped]*ratio
+    targets[clamped, 2] = np.where(ok, Zc*scale, Z[clamped])
+    return targets, clamped
+
+
+class AnalyticIK:
+    """Closed-form IK backend, the reference for all other backends."""
+
+    def __init__(self, coxa_length: float, femur_length: float, tibia_length: float):
+        self.coxa_length = coxa_length
+        self.femur_length = femur_length
+        self.tibia_length = tibia_length
+
+    def solve(self, targets: np.ndarray,
+              legs: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Joint angles for targets; legs selects the leg numbers of a (k, 3) subset."""
+        return solve_joints(targets, self.coxa_length, self.femur_length, self.tibia_length)
+
+
+def joints_to_servo(joints: np.ndarray, cal: np.ndarray,
+                    legs: Optional[np.ndarray] = None) -> np.ndarray:
+    """Apply horn offsets, calibration and coxa mounting to raw joint angles.
+
+    cal is a (6, 3) array of (coxa, femur, tibia) calibration per leg.
+    If legs is given, joints hold only those legs, in that order.
+    Returns constrained servo angles in degrees as float.
+    """
+    mount_neg, mount_pos = COXA_MOUNT_NEG, COXA_MOUNT_POS
+    if legs is not None:
+        cal = cal[legs]
+        mount_neg, mount_pos = mount_neg[legs], mount_pos[legs]
+    servo = np.empty(joints.shape, dtype=np.float64)
+    coxa = joints[..., 0] + cal[:, 0]
+    servo[..., 0] = coxa + np.where(coxa < 0, mount_neg, mount_pos)
+    servo[..., 1] = joints[..., 1] + FEMUR_OFFSET + 90.0 + cal[:, 1]
+    servo[..., 2] = joints[..., 2] + TIBIA_OFFSET + cal[:, 2]
+    return np.clip(servo, 0.0, 180.0, out=servo)
+
+
+def servo_to_joints(servo: np.ndarray, cal: np.ndarray,
+                    legs: Optional[np.ndarray] = None) -> np.ndarray:
+    """Inverse of joints_to_servo (ignoring clipping).
+
+    Rear leg coxa angles come back on the [0, 360) branch, which is
+    congruent to what solve_joints returns and gives the same positions.
+    """
+    mount_pos = COXA_MOUNT_POS
+    if legs is not None:
+        cal = cal[legs]
+        mount_pos = mount_pos[legs]
+    joints = np.empty(servo.shape, dtype=np.float64)
+    joints[..., 0] = servo[..., 0] - mount_pos - cal[:, 0]
+    joints[..., 1] = servo[..., 1] - 90.0 - FEMUR_OFFSET - cal[:, 1]
+    joints[..., 2] = servo[..., 2] - TIBIA_OFFSET - cal[:, 2]
+    return joints
+
+
+#***********************************************************************
+# Single leg
+# Scalar clamp_to_reach, solve_joints and joints_to_servo for the live
+# frame. With six legs NumPy's per-call overhead costs more than the
+# arithmetic, so Hexapod.legs_IK solves leg by leg with math and keeps
+# the batched functions for trajectories.
+#***********************************************************************
+def clamp_leg(X: float, Y: float, Z: float, coxa_length: float, femur_length: float,
+              tibia_length: float, margin: float = 0.5) -> Tuple[float, float, float, bool]:
+    """clamp_to_reach for one target, returns (X, Y, Z, clamped)."""
+    r = math.sqrt(X*X + Y*Y)
+    L0 = r - coxa_length
+    L3 = math.sqrt(L0*L0 + Z*Z)
+    if tibia_length - femur_length < L3 < tibia_length + femur_length:
+        return X, Y, Z, False
+
+    if L3 <= 0:
+        L0, Z_dir, L3 = 0.0, -1.0, 1.0               #degenerate: reach straight down
+    else:
+        Z_dir = Z
+    scale = min(max(L3, tibia_length - femur_length + margin), tibia_length + femur_length - margin)/L3
+    r_new = L0*scale + coxa_length
+    if r > 0 and r_new >= 0:
+        ratio = r_new/r
+        return X*ratio, Y*ratio, Z_dir*scale, True
+    return X, Y, Z, True
+
+
+def solve_leg(X: float, Y: float, Z: float, coxa_length: float, femur_length: float,
+              tibia_length: float) -> Optional[Tuple[float, float, float]]:
+    """solve_joints for one target, None if it is out of reach."""
+    L0 = math.sqrt(X*X + Y*Y) - coxa_length
+    L3 = math.sqrt(L0*L0 + Z*Z)
+    if not tibia_length - femur_length < L3 < tibia_length + femur_length:
+        return None
+
+    femur2 = femur_length*femur_length
+    tibia2 = tibia_length*tibia_length
+    L3_2 = L3*L3
+    cos_tibia = (femur2 + tibia2 - L3_2)/(2*femur_length*tibia_length)
+    cos_femur = (femur2 + L3_2 - tibia2)/(2*femur_length*L3)
+    #clipped like solve_joints; conditionals, min/max calls cost more than the trig
+    phi_tibia = math.acos(-1.0 if cos_tibia < -1.0 else 1.0 if cos_tibia > 1.0 else cos_tibia)
+    phi_femur = math.acos(-1.0 if cos_femur < -1.0 else 1.0 if cos_femur > 1.0 else cos_femur)
+    gamma_femur = math.atan2(Z, L0)
+    return (math.atan2(X, Y)*RAD_TO_DEG,
+            (phi_femur + gamma_femur)*RAD_TO_DEG,
+            phi_tibia*RAD_TO_DEG)
+
+
+def leg_to_servo(leg: int, coxa: float, femur: float, tibia: float,
+                 cal: Tuple[float, float, float]) -> Tuple[int, int, int]:
+    """joints_to_servo for one leg, truncated to int servo commands."""
+    coxa = coxa + cal[0]
+    coxa += COXA_MOUNT_NEG_LIST[leg] if coxa < 0 else COXA_MOUNT_POS_LIST[leg]
+    femur = femur + FEMUR_OFFSET + 90.0 + cal[1]
+    tibia = tibia + TIBIA_OFFSET + cal[2]
+    return (0 if coxa < 0.0 else 180 if coxa > 180.0 else int(coxa),
+            0 if femur < 0.0 else 180 if femur > 180.0 else int(femur),
+            0 if tibia < 0.0 else 180 if tibia > 180.0 else int(tibia))
+
+
+def rotation_matrix(rot_x: float, rot_y: float, rot_z: float) -> np.ndarray:
+    """Body rotation (radians) as used by Hexapod.rotate_control.
+
+    Applied to row vectors as v @ R.T; with rot_x = rot_y = 0 it is the
+    walking yaw of Hexapod.stride_amplitudes.
+    """
+    sx, cx = math.sin(rot_x), math.cos(rot_x)
+    sy, cy = math.sin(rot_y), math.cos(rot_y)
+    sz, cz = math.sin(rot_z), math.cos(rot_z)
+    return np.array([
+        [ cy*cz,  sx*sy*cz + cx*sz, -cx*sy*cz + sx*sz],
+        [-cy*sz, -sx*sy*sz + cx*cz,  cx*sy*sz + sx*cz],
+        [ sy,    -sx*cy,             cx*cy],
+    ])
+
+
+#***********************************************************************
+# Forward kinematics
+# Raw joint angles (as returned by solve_joints) back to coxa-to-toe
+# foot positions. The femur angle is its elevation above the coxa-toe
+# line, the tibia angle is the inner knee angle.
+#***********************************************************************
+def leg_FK(coxa: float, femur: float, tibia: float, coxa_length: float,
+           femur_length: float, tibia_length: float) -> Tuple[float, float, float]:
+    """Scalar forward kinematics for one leg, angles in degrees."""
+    theta = coxa/RAD_TO_DEG
+    alpha = femur/RAD_TO_DEG
+    knee = alpha + tibia/RAD_TO_DEG
+    reach = coxa_length + femur_length*math.cos(alpha) - tibia_length*math.cos(knee)
+    Z = femur_length*math.sin(alpha) - tibia_length*math.sin(knee)
+    return reach*math.sin(theta), reach*math.cos(theta), Z
+
+
+def solve_positions(joints: np.ndarray, coxa_length: float, femur_length: float,
+                    tibia_length: float) -> np.ndarray:
+    """Batched forward kinematics, (..., 3) joint angles to (..., 3) targets."""
+    theta = joints[..., 0]/RAD_TO_DEG
+    alpha = joints[..., 1]/RAD_TO_DEG
+    knee = alpha + joints[..., 2]/RAD_TO_DEG
+    reach = coxa_length + femur_length*np.cos(alpha) - tibia_length*np.cos(knee)
+    positions = np.empty(joints.shape, dtype=np.float64)
+    positions[..., 0] = reach*np.sin(theta)
+    positions[..., 1] = reach*np.cos(theta)
+    positions[..., 2] = femur_length*np.sin(alpha) - tibia_length*np.sin(knee)
+    return positions
+
+
+def jacobian(joints: np.ndarray, coxa_length: float, femur_length: float,
+             tibia_length: float) -> np.ndarray:
+    """d(X, Y, Z)/d(coxa, femur, tibia) in mm per degree, shape (..., 3, 3)."""
+    theta = joints[..., 0]/RAD_TO_DEG
+    alpha = joints[..., 1]/RAD_TO_DEG
+    knee = alpha + joints[..., 2]/RAD_TO_DEG
+    sin_t, cos_t = np.sin(theta), np.cos(theta)
+    reach = coxa_length + femur_length*np.cos(alpha) - tibia_length*np.cos(knee)
+    dreach_tibia = tibia_length*np.sin(knee)
+    dreach_femur = dreach_tibia - femur_length*np.sin(alpha)
+    dz_tibia = -tibia_length*np.cos(knee)
+    dz_femur = dz_tibia + femur_length*np.cos(alpha)
+
+    J = np.empty(joints.shape + (3,), dtype=np.float64)
+    J[..., 0, 0] = reach*cos_t
+    J[..., 0, 1] = sin_t*dreach_femur
+    J[..., 0, 2] = sin_t*dreach_tibia
+    J[..., 1, 0] = -reach*sin_t
+    J[..., 1, 1] = cos_t*dreach_femur
+    J[..., 1, 2] = cos_t*dreach_tibia
+    J[..., 2, 0] = 0.0
+    J[..., 2, 1] = dz_femur
+    J[..., 2, 2] = dz_tibia
+    return J/RAD_TO_DEG
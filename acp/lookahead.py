@@ -0,0 +1,119 @@
+#***********************************************************************
+# Look-ahead walking pipeline
+# A worker thread steps a snapshot of the robot's gait state ahead of
+# the clock and solves the frames in one batched trajectory_IK call.
+# The real-time loop then only picks the frame due now and writes its
+# servo angles. Frames are tied to the walking state (Hexapod.walk_key)
+# and stick command they were computed for. When the state changes or
+# the stick moves more than COMMAND_DEADBAND away from that command, the
+# queue is dropped and the loop computes live until the worker has
+# caught up again; stick jitter within the deadband keeps the queue.
+#***********************************************************************
+import logging
+import threading
+from collections import deque
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class LookAhead:
+
+    COMMAND_DEADBAND = 4.0              #stick units (of 127) the command may drift from the queued one
+
+    def __init__(self, robot, frames: int = 32, frame_ms: float = None):
+        self.robot = robot
+        self.batch = frames
+        self.frame_s = (frame_ms or robot.FRAME_TIME_MS)/1000.0
+
+        self.cond = threading.Condition()
+        self.queue = deque()            #(time, positions (6, 3), targets (6, 3), angles (18,), state)
+        self.key = None                 #walk_key the queued frames belong to
+        self.command = None             #stick command the queued frames are computed for
+        self.generation: int = 0
+        self.pending = None             #(generation, command, snapshot, start time) for the worker
+        self.tail = None                #(snapshot, time) at the end of the queue
+
+        self.hits: int = 0              #frames output from the queue
+        self.misses: int = 0            #frames computed live
+
+        self.thread = threading.Thread(target=self._run, name="lookahead", daemon=True)
+        self.thread.start()
+
+    def consume(self, command) -> bool:
+        """Output the precomputed frame due now, False if the caller must compute it."""
+        robot = self.robot
+        key = robot.walk_key(command)
+        now = robot.clock()
+        with self.cond:
+            if key != self.key or self.moved(command):
+                #command changed, restart the worker from the live state
+                self.key = key
+                self.command = command
+                self.generation += 1
+                self.queue.clear()
+                self.tail = None
+                self.pending = (self.generation, command, robot.walk_snapshot(), now)
+                self.cond.notify()
+                self.misses += 1
+                return False
+
+            while len(self.queue) > 1 and self.queue[1][0] <= now:
+                self.queue.popleft()    #late, skip frames that are already past
+            if not self.queue or self.queue[0][0] > now + self.frame_s:
+                self.misses += 1
+                frame = None
+            else:
+                frame = self.queue.popleft()
+
+            if len(self.queue) < self.batch//2 and self.pending is None and self.tail is not None:
+                snapshot, t = self.tail
+                self.tail = None
+                self.pending = (self.generation, self.command, snapshot, t)
+                self.cond.notify()
+        if frame is None:
+            return False
+
+        _, positions, targets, angles, state = frame
+        robot.gait_phase, robot.gait_duration, robot.blend, walking = state
+        robot.gait_time = now if walking else None
+        robot.current[:] = positions
+        robot.write_legs(list(range(6)), angles.reshape(6, 3).tolist(), [True]*6)
+        robot.last_targets[:] = targets        #next frame's IK has nothing left to do
+        self.hits += 1
+        return True
+
+    def moved(self, command) -> bool:
+        return any(abs(a - b) > self.COMMAND_DEADBAND for a, b in zip(command, self.command))
+
+    def _run(self) -> None:
+        while True:
+            with self.cond:
+                while self.pending is None:
+                    self.cond.wait()
+                generation, command, snapshot, t = self.pending
+                self.pending = None
+
+            offsets = snapshot.offset.copy()
+            times = []
+            positions = []
+            states = []
+            for _ in range(self.batch):
+                t += self.frame_s
+                position = snapshot.step_walk(command, t)
+                if position is None:
+                    position = snapshot.current.copy()
+                times.append(t)
+                positions.append(position)
+                states.append((snapshot.gait_phase, snapshot.gait_duration, snapshot.blend,
+                               snapshot.gait_time is not None))
+            positions = np.array(positions)
+            targets = positions + offsets
+            angles = snapshot.trajectory_IK(targets, initial=snapshot.servo_angles.reshape(18))
+
+            with self.cond:
+                if generation != self.generation:
+                    continue
+                self.queue.extend(zip(times, positions, targets, angles, states))
+                self.tail = (snapshot, t)
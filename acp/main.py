@@ -2,6 +2,7 @@ from email.policy import default
 import click
 import logging
 from acp.acp_robot import AcpRobot
+from acp.realtime import RealtimeMode, log_via_queue
 
 @click.command()
 @click.argument("config_file_path", default="./robot_config.json")
@@ -9,7 +10,22 @@ from acp.acp_robot import AcpRobot
 @click.option("--debug-servo", is_flag=True, default=False)
 @click.option("--debug-led", is_flag=True, default=False)
 @click.option("--log-level", type=str, default="INFO")
-def main(config_file_path, controller=None, debug_servo=False, debug_led=False, log_level="INFO"):
+@click.option("--ik-backend", type=click.Choice(list(AcpRobot.IK_BACKENDS)), default="analytic", help="IK solver, analytic is the fastest (python benchmark.py ik-loop)")
+@click.option("--ik-cache-size", type=int, default=0, help="LRU size of memoized IK results, 0 disables")
+@click.option("--ik-cache-resolution", type=float, default=0.1, help="IK cache key resolution in mm")
+@click.option("--lookahead", type=int, default=0, help="Walking frames precomputed by a worker thread, 0 disables")
+@click.option("--realtime", is_flag=True, default=False, help="SCHED_FIFO control loop on its own core, memory locked, GC in slack time")
+@click.option("--rt-priority", type=click.IntRange(1, 99), default=50, help="SCHED_FIFO priority of the control loop")
+@click.option("--rt-cpu", type=int, default=None, help="Core for the control loop, default the last one")
+@click.option("--input-rate", type=float, default=None, help="Controller polling rate in Hz, a multiple of the other two")
+@click.option("--kinematics-rate", type=float, default=None, help="Gait/IK rate in Hz")
+@click.option("--servo-rate", type=float, default=None, help="Servo output rate in Hz, default the PWM frequency")
+@click.option("--clip-cache-dir", type=str, default=None, help="Motion clip files, default $ARR_CACHE_DIR/clips or ~/.cache/arr/clips")
+def main(config_file_path, controller=None, debug_servo=False, debug_led=False, log_level="INFO",
+         ik_backend="analytic", ik_cache_size=0, ik_cache_resolution=0.1,
+         lookahead=0,
+         realtime=False, rt_priority=50, rt_cpu=None,
+         input_rate=None, kinematics_rate=None, servo_rate=None, clip_cache_dir=None):
     level = logging.getLevelName(log_level)
     logging.basicConfig(
         level=level,
@@ -18,7 +34,17 @@ def main(config_file_path, controller=None, debug_servo=False, debug_led=False,
         logging.StreamHandler()
         ]
     )
-    AcpRobot(config_file_path, controller=controller, debug_servo=debug_servo, debug_led=debug_led).run()
+    realtime_mode = None
+    if realtime:
+        realtime_mode = RealtimeMode(priority=rt_priority, cpu=rt_cpu)
+        realtime_mode.isolate()
+        log_via_queue()                     #log output written by a thread on the other cores
+    AcpRobot(config_file_path, controller=controller, debug_servo=debug_servo, debug_led=debug_led,
+             ik_backend=ik_backend, ik_cache_size=ik_cache_size,
+             ik_cache_resolution=ik_cache_resolution, lookahead=lookahead,
+             realtime=realtime_mode, input_rate_hz=input_rate,
+             kinematics_rate_hz=kinematics_rate, servo_rate_hz=servo_rate,
+             clip_cache_dir=clip_cache_dir).run()
 
 
 if __name__ == "__main__":
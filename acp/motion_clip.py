@@ -0,0 +1,269 @@
+#***********************************************************************
+# Motion clips
+# Fixed maneuvers (standing up, turning in place, walking a fixed
+# stride) precomputed once as an 18-channel servo angle stream and
+# played straight to the servos, with no gait or IK work per frame.
+# A clip file is a 16 byte header followed by uint8 angles, frame major
+# in all_servos order (coxa1, femur1, tibia1, coxa2, ...), and is
+# memory-mapped for playback. Computed clips are keyed by a hash of the
+# leg geometry, home position, calibration and gait speed, so they are
+# rebuilt when any of those change. All clips are compiled when the
+# robot starts (see ClipLibrary.compile) and, after a calibration
+# change, by a worker thread (ClipLibrary.compile_async), never from
+# the main loop. Clip files live in $ARR_CACHE_DIR/clips, by default
+# ~/.cache/arr/clips. Run `python motion_clip.py build` to precompute
+# them.
+#***********************************************************************
+import os
+import json
+import queue
+import struct
+import threading
+import hashlib
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+import click
+import numpy as np
+
+import gait
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"ARRC"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIf")   #magic, version, channels, frames, frame_ms
+CHANNELS = 18
+
+CLIP_FRAME_MS = 20.0                #50 Hz, the servo PWM rate
+GAIT_SPEEDS = (0, 1)                #normal and slow, see Hexapod.cycle_duration
+CLIP_STEP_HEIGHT = 1.0              #step height multiplier of the walking clips
+
+
+class MotionClip:
+
+    def __init__(self, angles: np.ndarray, frame_ms: float = CLIP_FRAME_MS, name: str = ""):
+        if angles.ndim != 2 or angles.shape[1] != CHANNELS:
+            raise ValueError(f"Clip {name}: expected (frames, {CHANNELS}) angles, got {angles.shape}")
+        self.angles = angles
+        self.frame_ms = frame_ms
+        self.name = name
+
+    @property
+    def frames(self) -> int:
+        return len(self.angles)
+
+    @property
+    def duration_ms(self) -> float:
+        return self.frames*self.frame_ms
+
+    def frame(self, elapsed_ms: float) -> Optional[np.ndarray]:
+        """Angles of the frame playing at elapsed_ms, None once the clip is over."""
+        index = int(elapsed_ms/self.frame_ms)
+        if index >= self.frames:
+            return None
+        return self.angles[max(index, 0)]
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, CHANNELS, self.frames, self.frame_ms))
+            f.write(np.clip(self.angles, 0, 180).astype(np.uint8).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "MotionClip":
+        with open(path, "rb") as f:
+            magic, version, channels, frames, frame_ms = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION or channels != CHANNELS:
+            raise ValueError(f"Clip {path}: unsupported format {magic!r} v{version}, {channels} channels")
+        angles = np.memmap(path, dtype=np.uint8, mode="r", offset=HEADER.size, shape=(frames, channels))
+        name = os.path.basename(path).rsplit(".", 1)[0]
+        return cls(angles, frame_ms, name)
+
+    @classmethod
+    def from_recording(cls, times_ms: List[float], angles: List[List[int]],
+                       frame_ms: float = CLIP_FRAME_MS, name: str = "") -> "MotionClip":
+        """Resample servo angles captured at irregular frame times onto frame_ms steps."""
+        times_ms = np.asarray(times_ms, dtype=np.float64) - times_ms[0]
+        steps = np.arange(0.0, times_ms[-1] + frame_ms, frame_ms)
+        index = np.clip(np.searchsorted(times_ms, steps, side="right") - 1, 0, len(times_ms) - 1)
+        return cls(np.asarray(angles, dtype=np.uint8)[index], frame_ms, name)
+
+
+#***********************************************************************
+# Built-in clips
+# Each builder takes the robot and a gait speed and returns (frames, 6, 3)
+# foot targets at CLIP_FRAME_MS. Builders only read the robot geometry,
+# never its walking state.
+#***********************************************************************
+STAND_START_Z = -20.0               #toe height with the body resting on the ground
+STAND_UP_MS = 1500.0
+
+
+def stand_up(robot, gait_speed: int) -> np.ndarray:
+    frames = int(STAND_UP_MS/CLIP_FRAME_MS) + 1
+    u = 0.5 - 0.5*np.cos(np.pi*np.linspace(0.0, 1.0, frames))     #ease in/out
+    targets = np.repeat(robot.home[None], frames, axis=0)
+    targets[..., 2] = STAND_START_Z + (robot.home[:, 2] - STAND_START_Z)*u[:, None]
+    return targets
+
+
+def walk_cycle(robot, gait_speed: int, definition: gait.GaitDefinition, commandedX: float,
+               commandedY: float, commandedR: float, cycles: int = 1) -> np.ndarray:
+    amplitudes = robot.stride_amplitudes(*robot.stride_lengths(commandedX, commandedY, commandedR),
+                                         CLIP_STEP_HEIGHT)
+    num_ticks = max(2, round(robot.cycle_duration(gait_speed)/CLIP_FRAME_MS/definition.phases))
+    table = gait.compile_gait(definition, num_ticks)
+    return robot.home + amplitudes*np.tile(table, (cycles, 1, 1))
+
+
+BUILDERS: Dict[str, Callable] = {
+    "stand_up": stand_up,
+    "turn_left": lambda robot, gait_speed: walk_cycle(robot, gait_speed, gait.TRIPOD, 0, 0, 127, cycles=2),
+    "turn_right": lambda robot, gait_speed: walk_cycle(robot, gait_speed, gait.TRIPOD, 0, 0, -127, cycles=2),
+    "walk_forward": lambda robot, gait_speed: walk_cycle(robot, gait_speed, gait.TRIPOD, 127, 0, 0, cycles=2),
+}
+
+
+class ClipLibrary:
+    """Clips by name and gait speed, loaded once and memory-mapped.
+
+    Recorded clips (see save) are looked up first, then the computed
+    ones (BUILDERS and anything added with register), which are built
+    with the robot's trajectory_IK by compile or compile_async and
+    cached on disk. get only returns compiled clips, it never builds one.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir or os.path.join(
+            os.environ.get("ARR_CACHE_DIR", os.path.expanduser("~/.cache/arr")), "clips")
+        self.clips: Dict[Tuple[str, int], MotionClip] = {}
+        self.builders: Dict[str, Callable] = dict(BUILDERS)
+        self.sources: Dict[str, str] = {}
+        self.generation: int = 0        #bumped by clear, compiles started before it are dropped
+        self.requests = queue.Queue()   #robots to compile for, see compile_async
+        self.worker = None
+
+    def register(self, name: str, builder: Callable, source: str = "") -> None:
+        """Add a computed clip; source (e.g. its definition) is part of the cache key."""
+        self.builders[name] = builder
+        self.sources[name] = source
+        self.forget(name)
+
+    def robot_key(self, robot, name: str = "", gait_speed: int = 0) -> str:
+        robot_state = {
+            "version": VERSION,
+            "lengths": [robot.COXA_LENGTH, robot.FEMUR_LENGTH, robot.TIBIA_LENGTH],
+            "home": robot.home.tolist(),
+            "cal": robot.cal_array.tolist(),
+            "gait_speed": gait_speed,
+            "source": self.sources.get(name, ""),
+        }
+        return hashlib.sha1(json.dumps(robot_state, sort_keys=True).encode()).hexdigest()[:16]
+
+    def names(self) -> List[str]:
+        recorded = []
+        if os.path.isdir(self.cache_dir):
+            recorded = [f[:-len(".clip")] for f in os.listdir(self.cache_dir)
+                        if f.endswith(".clip") and "@" not in f]
+        return sorted(set(recorded) | set(self.builders))
+
+    def compile(self, robot) -> None:
+        """Load or build every clip for every gait speed; already loaded ones are kept."""
+        generation = self.generation
+        built = {}
+        for name in self.names():
+            for gait_speed in GAIT_SPEEDS:
+                if (name, gait_speed) not in self.clips:
+                    built[(name, gait_speed)] = self.load(robot, name, gait_speed)
+        if generation == self.generation:
+            self.clips.update(built)
+
+    def start_worker(self) -> None:
+        """Thread for compile_async; start it before the control loop so it stays off the loop core."""
+        self.worker = threading.Thread(target=self._run, name="clips", daemon=True)
+        self.worker.start()
+
+    def compile_async(self, robot) -> None:
+        """compile on the worker thread, clips become playable as soon as it is done."""
+        self.requests.put(robot)
+
+    def _run(self) -> None:
+        while True:
+            robot = self.requests.get()
+            try:
+                self.compile(robot)
+            except Exception:
+                logger.exception("Compiling motion clips failed")
+
+    def load(self, robot, name: str, gait_speed: int) -> MotionClip:
+        recorded_path = os.path.join(self.cache_dir, f"{name}.clip")
+        built_path = os.path.join(self.cache_dir, f"{name}@{self.robot_key(robot, name, gait_speed)}.clip")
+        if os.path.exists(recorded_path):
+            clip = MotionClip.load(recorded_path)
+        elif name in self.builders:
+            if not os.path.exists(built_path):
+                logger.info("Building motion clip %s", built_path)
+                angles = robot.trajectory_IK(self.builders[name](robot, gait_speed))
+                MotionClip(angles, CLIP_FRAME_MS, name).save(built_path)
+            clip = MotionClip.load(built_path)
+        else:
+            raise KeyError(f"Motion clip {name} not found. Valid options: {self.names()}")
+        clip.name = name
+        return clip
+
+    def get(self, robot, name: str) -> MotionClip:
+        clip = self.clips.get((name, robot.gait_speed))
+        if clip is None:
+            compiled = sorted({n for n, _ in self.clips})
+            raise KeyError(f"Motion clip {name} not compiled. Valid options: {compiled}")
+        return clip
+
+    def save(self, clip: MotionClip) -> str:
+        path = os.path.join(self.cache_dir, f"{clip.name}.clip")
+        clip.save(path)
+        #recorded clips play at any gait speed
+        recorded = MotionClip.load(path)
+        for gait_speed in GAIT_SPEEDS:
+            self.clips[(clip.name, gait_speed)] = recorded
+        logger.info("Saved motion clip %s, %s frames", path, clip.frames)
+        return path
+
+    def forget(self, name: str) -> None:
+        for gait_speed in GAIT_SPEEDS:
+            self.clips.pop((name, gait_speed), None)
+
+    def clear(self) -> None:
+        #forget loaded clips, e.g. after a calibration change; compile loads them again
+        self.generation += 1
+        self.clips.clear()
+
+
+@click.group()
+def cli() -> None:
+    pass
+
+
+@cli.command()
+@click.option("--config", "config_file_path", default="robot_config.json", help="Robot config to load")
+def build(config_file_path: str) -> None:
+    """Precompute the built-in clips and choreographies for the current calibration."""
+    from hexapod import Hexapod
+    robot = Hexapod(config_file_path)     #compiles every clip on start
+    for (name, gait_speed), clip in sorted(robot.clips.clips.items()):
+        click.echo(f"{name:14s} speed {gait_speed} {clip.frames:5d} frames  {clip.duration_ms/1000:.2f} s")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="[%(levelname)s][%(name)s] %(message)s",
+        handlers=[
+        logging.StreamHandler()
+        ]
+    )
+    cli()
@@ -0,0 +1,127 @@
+#***********************************************************************
+# Loop stage profiler
+# Durations of each control loop stage go into HDR-style histograms:
+# buckets are exact below 2**SUB_BITS ns and above that split every
+# power of two into 2**(SUB_BITS-1) linear steps, so any recorded value
+# is known to within ~6% with a few hundred integer counters per stage
+# and no allocation per sample. Each histogram holds the inclusive time
+# of its stage. clip, ik, gait and mode run in the kinematics step;
+# servo_write runs from loop() on its own ticks and contains head (the
+# AcpRobot head servos), the only nested stage.
+#***********************************************************************
+import time
+import logging
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+SUB_BITS = 5
+HALF = 1 << (SUB_BITS - 1)
+
+
+def bucket_index(value: int) -> int:
+    shift = max(value.bit_length() - SUB_BITS, 0)
+    return shift*HALF + (value >> shift)
+
+
+def bucket_value(index: int) -> int:
+    """Lowest value of a bucket."""
+    if index < 2*HALF:
+        return index
+    shift = (index >> (SUB_BITS - 1)) - 1
+    return (index - shift*HALF) << shift
+
+
+class LatencyHistogram:
+
+    def __init__(self):
+        self.counts: List[int] = [0]*bucket_index(1 << 40)    #up to ~18 minutes in ns
+        self.count: int = 0
+        self.total: int = 0
+        self.max: int = 0
+
+    def record(self, value: int) -> None:
+        self.counts[min(bucket_index(value), len(self.counts) - 1)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p: float) -> int:
+        """Upper bound of the value at percentile p (0-100), in the recorded unit."""
+        if self.count == 0:
+            return 0
+        rank = max(1, round(p/100.0*self.count))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bucket_value(index + 1) - 1, self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total/self.count if self.count else 0.0
+
+    def reset(self) -> None:
+        self.counts = [0]*len(self.counts)
+        self.count = self.total = self.max = 0
+
+
+class Stage:
+    """Times a with block into its histogram. One instance per stage, not reentrant."""
+
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: LatencyHistogram):
+        self.histogram = histogram
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+
+    def __exit__(self, *exc):
+        self.histogram.record(time.perf_counter_ns() - self.start)
+
+
+class StageProfiler:
+
+    def __init__(self):
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.stages: Dict[str, Stage] = {}
+
+    def histogram(self, name: str) -> LatencyHistogram:
+        if name not in self.histograms:
+            self.histograms[name] = LatencyHistogram()
+            self.stages[name] = Stage(self.histograms[name])
+        return self.histograms[name]
+
+    def stage(self, name: str) -> Stage:
+        if name not in self.stages:
+            self.histogram(name)
+        return self.stages[name]
+
+    def record(self, name: str, duration_ns: int) -> None:
+        self.histogram(name).record(duration_ns)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per stage count and mean/p50/p90/p99/max in microseconds."""
+        return {name: {
+            "count": h.count,
+            "mean_us": h.mean/1000.0,
+            "p50_us": h.percentile(50)/1000.0,
+            "p90_us": h.percentile(90)/1000.0,
+            "p99_us": h.percentile(99)/1000.0,
+            "max_us": h.max/1000.0,
+        } for name, h in self.histograms.items()}
+
+    def report(self) -> str:
+        lines = [f"{'stage':16s} {'count':>8s} {'mean':>8s} {'p50':>8s} {'p90':>8s} {'p99':>8s} {'max':>9s} us"]
+        for name, s in self.summary().items():
+            lines.append(f"{name:16s} {s['count']:8d} {s['mean_us']:8.1f} {s['p50_us']:8.1f} "
+                         f"{s['p90_us']:8.1f} {s['p99_us']:8.1f} {s['max_us']:9.1f}")
+        return "\n".join(lines)
+
+    def reset(self) -> None:
+        for histogram in self.histograms.values():
+            histogram.reset()
@@ -0,0 +1,100 @@
+#***********************************************************************
+# Real-time execution
+# Runs the control loop thread under SCHED_FIFO on a core of its own,
+# with memory locked and the garbage collector taken out of the frame:
+# objects alive after startup are frozen out of collection and the
+# remaining collections run only when a frame finishes with enough
+# slack before the next deadline. Every other thread (controller,
+# Thrift server, look-ahead worker, clip compiler, log listener) is
+# started after isolate() and inherits the remaining cores. Needs
+# CAP_SYS_NICE and CAP_IPC_LOCK (or root); whatever cannot be applied
+# is logged and skipped, so the robot still runs without it.
+#***********************************************************************
+import os
+import gc
+import ctypes
+import ctypes.util
+import queue
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+
+class RealtimeMode:
+
+    GC_MIN_SLACK_MS = 3.0           #collect only with this much of the frame left
+
+    def __init__(self, priority: int = 50, cpu: Optional[int] = None):
+        self.priority = priority
+        cpus = sorted(os.sched_getaffinity(0))
+        self.cpu = cpus[-1] if cpu is None else cpu
+        if self.cpu not in cpus:
+            raise ValueError(f"CPU {self.cpu} not available. Valid options: {cpus}")
+        self.others = set(cpus) - {self.cpu} or {self.cpu}
+        self.isolated: bool = False
+        self.gc_runs: int = 0           #collections run in slack time
+        self.gc_deferred: int = 0       #frames a collection was due but slack too short
+
+    def isolate(self) -> None:
+        """Keep the calling thread, and threads it starts from now on, off the loop core."""
+        if self.isolated:
+            return
+        self.isolated = True
+        if self.others == {self.cpu}:
+            logger.warning("Only CPU %s available, the control loop shares it with all threads", self.cpu)
+        os.sched_setaffinity(0, self.others)
+        logger.info("Threads on CPUs %s, control loop on CPU %s", sorted(self.others), self.cpu)
+
+    def enter(self) -> None:
+        """Make the calling thread the real-time control loop thread."""
+        os.sched_setaffinity(0, {self.cpu})
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(self.priority))
+            logger.info("SCHED_FIFO priority %s", self.priority)
+        except (AttributeError, OSError) as e:
+            logger.warning("Unable to set SCHED_FIFO: %s", e)
+        lock_memory()
+        gc.collect()
+        gc.freeze()                     #startup objects are never scanned again
+        gc.disable()
+
+    def idle(self, slack_ns: int) -> None:
+        """Run a due garbage collection if the frame has slack_ns left."""
+        counts = gc.get_count()
+        thresholds = gc.get_threshold()
+        generation = -1
+        for g in range(3):
+            if thresholds[g] and counts[g] >= thresholds[g]:
+                generation = g
+        if generation < 0:
+            return
+        if slack_ns < self.GC_MIN_SLACK_MS*1_000_000:
+            self.gc_deferred += 1
+            return
+        gc.collect(generation)
+        self.gc_runs += 1
+
+
+def lock_memory() -> bool:
+    """mlockall current and future pages, so the loop never takes a page fault to swap."""
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    if libc.mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+        logger.warning("Unable to lock memory: %s", os.strerror(ctypes.get_errno()))
+        return False
+    logger.info("Memory locked")
+    return True
+
+
+def log_via_queue() -> QueueListener:
+    """Move log output off the calling threads: records are queued and written by a listener thread."""
+    root_logger = logging.getLogger()
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *root_logger.handlers, respect_handler_level=True)
+    root_logger.handlers = [QueueHandler(log_queue)]
+    listener.start()
+    return listener
@@ -0,0 +1,108 @@
+#***********************************************************************
+# Fixed-rate frame scheduler
+# Frames start on absolute deadlines on the monotonic clock, so the
+# frame work does not add to the period and wall clock steps (NTP) do
+# not disturb the rate. A frame that starts late is an overrun; if it is
+# late by whole periods those frames are skipped rather than run back
+# to back to catch up. Start lateness (jitter) of recent frames is kept
+# for report().
+#***********************************************************************
+import time
+import logging
+from typing import Callable, Dict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+JITTER_SAMPLES = 1024               #recent frames kept for the jitter percentiles
+
+
+class FixedRateScheduler:
+
+    def __init__(self, period_ms: float, clock_ns: Callable[[], int] = time.monotonic_ns,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.period_ns = int(period_ms*1_000_000)
+        self.clock_ns = clock_ns
+        self.sleep = sleep
+        self.deadline = None            #start time of the current frame, ns
+        self.start = None               #first deadline, ns
+
+        self.frames: int = 0
+        self.overruns: int = 0          #frames started after their deadline
+        self.skipped: int = 0           #deadlines dropped because a frame ran over them
+        self.lateness = np.zeros(JITTER_SAMPLES, dtype=np.int64)    #ring of start lateness, ns
+
+    def wait(self) -> int:
+        """Sleep until the next frame deadline, returns the number of frames skipped."""
+        now = self.clock_ns()
+        skipped = 0
+        if self.deadline is None:
+            self.deadline = self.start = now
+        else:
+            self.deadline += self.period_ns
+            if now < self.deadline:
+                self.sleep((self.deadline - now)/1e9)
+                now = self.clock_ns()
+            else:
+                self.overruns += 1
+                skipped = (now - self.deadline)//self.period_ns
+                self.deadline += skipped*self.period_ns
+                self.skipped += skipped
+        self.lateness[self.frames % JITTER_SAMPLES] = now - self.deadline
+        self.frames += 1
+        return skipped
+
+    def slack_ns(self) -> int:
+        """Time left until the next frame deadline."""
+        return self.deadline + self.period_ns - self.clock_ns()
+
+    @property
+    def rate(self) -> float:
+        """Achieved frames per second since the first frame."""
+        if self.frames < 2:
+            return 0.0
+        return (self.frames - 1)*1e9/(self.deadline - self.start)
+
+    def stats(self) -> Dict[str, float]:
+        lateness = self.lateness[:min(self.frames, JITTER_SAMPLES)]/1000.0
+        p50, p99 = np.percentile(lateness, (50, 99)) if len(lateness) else (0.0, 0.0)
+        return {
+            "frames": self.frames,
+            "rate": self.rate,
+            "target_rate": 1e9/self.period_ns,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "jitter_p50_us": p50,
+            "jitter_p99_us": p99,
+            "jitter_max_us": lateness.max() if len(lateness) else 0.0,
+        }
+
+    def report(self) -> str:
+        s = self.stats()
+        return (f"{s['frames']} frames at {s['rate']:.1f}/{s['target_rate']:.1f} Hz, "
+                f"{s['overruns']} overruns, {s['skipped']} skipped, "
+                f"jitter p50/p99/max {s['jitter_p50_us']:.0f}/{s['jitter_p99_us']:.0f}/{s['jitter_max_us']:.0f} us")
+
+
+class RateCounter:
+    """Achieved rate of a step run on some of the frames."""
+
+    def __init__(self, clock_ns: Callable[[], int] = time.monotonic_ns):
+        self.clock_ns = clock_ns
+        self.count: int = 0
+        self.first: int = 0
+        self.last: int = 0
+
+    def tick(self) -> None:
+        now = self.clock_ns()
+        if self.count == 0:
+            self.first = now
+        self.last = now
+        self.count += 1
+
+    @property
+    def rate(self) -> float:
+        if self.count < 2 or self.last == self.first:
+            return 0.0
+        return (self.count - 1)*1e9/(self.last - self.first)
@@ -3,6 +3,8 @@ import logging
 logger = logging.getLogger(__name__)
 
 class Servo:
+    __slots__ = ("channel", "reverse")
+
     def __init__(self, channel, reverse: bool = False) -> None:
         self.channel = channel
         self.reverse = reverse
@@ -20,6 +22,10 @@ class Servo:
     def disable(self) -> None:
         self.channel.duty_cycle = 0
 
+    def release(self) -> None:
+        # stop the pulses, the servo goes limp
+        self.channel.angle = None
+
     def _rev(self, value: int) -> int:
         if self.reverse:
             return self.channel.actuation_range - value
@@ -40,6 +40,15 @@ class Iface(object):
         """
         pass
 
+    def play_clip(self, name, speed):
+        """
+        Parameters:
+         - name
+         - speed
+
+        """
+        pass
+
     def get_status(self):
         pass
 
@@ -121,6 +130,24 @@ class Client(Iface):
         self._oprot.writeMessageEnd()
         self._oprot.trans.flush()
 
+    def play_clip(self, name, speed):
+        """
+        Parameters:
+         - name
+         - speed
+
+        """
+        self.send_play_clip(name, speed)
+
+    def send_play_clip(self, name, speed):
+        self._oprot.writeMessageBegin('play_clip', TMessageType.ONEWAY, self._seqid)
+        args = play_clip_args()
+        args.name = name
+        args.speed = speed
+        args.write(self._oprot)
+        self._oprot.writeMessageEnd()
+        self._oprot.trans.flush()
+
     def get_status(self):
         self.send_get_status()
         return self.recv_get_status()
@@ -187,6 +214,7 @@ class Processor(Iface, TProcessor):
         self._processMap["ping"] = Processor.process_ping
         self._processMap["axis"] = Processor.process_axis
         self._processMap["button"] = Processor.process_button
+        self._processMap["play_clip"] = Processor.process_play_clip
         self._processMap["get_status"] = Processor.process_get_status
         self._processMap["get_logs"] = Processor.process_get_logs
         self._on_message_begin = None
@@ -256,6 +284,17 @@ class Processor(Iface, TProcessor):
         except Exception:
             logging.exception('Exception in oneway handler')
 
+    def process_play_clip(self, seqid, iprot, oprot):
+        args = play_clip_args()
+        args.read(iprot)
+        iprot.readMessageEnd()
+        try:
+            self._handler.play_clip(args.name, args.speed)
+        except TTransport.TTransportException:
+            raise
+        except Exception:
+            logging.exception('Exception in oneway handler')
+
     def process_get_status(self, seqid, iprot, oprot):
         args = get_status_args()
         args.read(iprot)
@@ -557,6 +596,80 @@ button_args.thrift_spec = (
 )
 
 
+class play_clip_args(object):
+    """
+    Attributes:
+     - name
+     - speed
+
+    """
+
+
+    def __init__(self, name=None, speed=None,):
+        self.name = name
+        self.speed = speed
+
+    def read(self, iprot):
+        if iprot._fast_decode is not None and isinstance(iprot.trans, TTransport.CReadableTransport) and self.thrift_spec is not None:
+            iprot._fast_decode(self, iprot, [self.__class__, self.thrift_spec])
+            return
+        iprot.readStructBegin()
+        while True:
+            (fname, ftype, fid) = iprot.readFieldBegin()
+            if ftype == TType.STOP:
+                break
+            if fid == 1:
+                if ftype == TType.STRING:
+                    self.name = iprot.readString().decode('utf-8') if sys.version_info[0] == 2 else iprot.readString()
+                else:
+                    iprot.skip(ftype)
+            elif fid == 2:
+                if ftype == TType.DOUBLE:
+                    self.speed = iprot.readDouble()
+                else:
+                    iprot.skip(ftype)
+            else:
+                iprot.skip(ftype)
+            iprot.readFieldEnd()
+        iprot.readStructEnd()
+
+    def write(self, oprot):
+        if oprot._fast_encode is not None and self.thrift_spec is not None:
+            oprot.trans.write(oprot._fast_encode(self, [self.__class__, self.thrift_spec]))
+            return
+        oprot.writeStructBegin('play_clip_args')
+        if self.name is not None:
+            oprot.writeFieldBegin('name', TType.STRING, 1)
+            oprot.writeString(self.name.encode('utf-8') if sys.version_info[0] == 2 else self.name)
+            oprot.writeFieldEnd()
+        if self.speed is not None:
+            oprot.writeFieldBegin('speed', TType.DOUBLE, 2)
+            oprot.writeDouble(self.speed)
+            oprot.writeFieldEnd()
+        oprot.writeFieldStop()
+        oprot.writeStructEnd()
+
+    def validate(self):
+        return
+
+    def __repr__(self):
+        L = ['%s=%r' % (key, value)
+             for key, value in self.__dict__.items()]
+        return '%s(%s)' % (self.__class__.__name__, ', '.join(L))
+
+    def __eq__(self, other):
+        return isinstance(other, self.__class__) and self.__dict__ == other.__dict__
+
+    def __ne__(self, other):
+        return not (self == other)
+all_structs.append(play_clip_args)
+play_clip_args.thrift_spec = (
+    None,  # 0
+    (1, TType.STRING, 'name', 'UTF8', None, ),  # 1
+    (2, TType.DOUBLE, 'speed', None, None, ),  # 2
+)
+
+
 class get_status_args(object):
 
 
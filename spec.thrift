@@ -84,6 +84,8 @@ service ARR_proto {
 
     oneway void button(1:ButtonID id, 2:bool value),
 
+    oneway void play_clip(1:string name, 2:double speed),
+
     ARR_status get_status(),
 
     list<string> get_logs(1: i32 offset),
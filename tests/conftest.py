@@ -0,0 +1,18 @@
+#***********************************************************************
+# The acp modules import each other flat (they run from the acp
+# directory), so the tests do the same. Files every Hexapod() writes
+# (motion clips) go to a temporary cache instead of ~/.cache.
+#***********************************************************************
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "acp"))
+
+import pytest
+
+
+@pytest.fixture(autouse=True, scope="session")
+def cache_dir(tmp_path_factory):
+    os.environ["ARR_CACHE_DIR"] = str(tmp_path_factory.mktemp("cache"))
+    yield
+    del os.environ["ARR_CACHE_DIR"]
@@ -0,0 +1,272 @@
+#***********************************************************************
+# Legacy gaits
+# The four hand-coded gait state machines Hexapod used before the
+# data-driven engine in gait.py, kept only as the reference the gait
+# tests compare the engine against. They are kept verbatim, including
+# the stray breaks that stop tetrapod_gait after the first leg it moves,
+# with the per-tick swing tables they were last run with.
+#***********************************************************************
+import math
+from functools import lru_cache
+from typing import List, Tuple
+
+from common import map
+from hexapod import Hexapod
+from gait import M_PI
+
+
+@lru_cache(maxsize=None)
+def swing_table(num_ticks: int, span: int = 1) -> Tuple[Tuple[float, ...], Tuple[float, ...]]:
+  """cos/sin of M_PI*i/(num_ticks*span) for every tick i of a swing."""
+  n = num_ticks*span
+  return (tuple(math.cos(M_PI*i/n) for i in range(n)),
+          tuple(math.sin(M_PI*i/n) for i in range(n)))
+
+
+def swing_phase(num_ticks: int, index: int, span: int = 1) -> Tuple[float, float]:
+  """(cos, sin) for one swing tick, computed directly if index is past the table."""
+  cos_table, sin_table = swing_table(num_ticks, span)
+  if index < len(cos_table):
+    return cos_table[index], sin_table[index]
+  angle = M_PI*index/(num_ticks*span)                 #tick left over from a longer duration
+  return math.cos(angle), math.sin(angle)
+
+
+class LegacyGaitHexapod(Hexapod):
+
+  def cycle_duration(self, gait_speed, commandedS=0):
+    #the legacy gaits count duration in ticks of SERVO_TIME_MS
+    return 1080 if gait_speed == 0 else 3240
+
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.tick: int = 0
+    self.tripod_case: List[int]   = [1,2,1,2,1,2]     #for tripod gait walking
+    self.ripple_case: List[int]   = [2,6,4,1,3,5]     #for ripple gait
+    self.wave_case: List[int]     = [1,2,3,4,5,6]     #for wave gait
+    self.tetrapod_case: List[int] = [1,3,2,1,2,3]     #for tetrapod gait
+
+  def walk(self):
+    if self.gait == self.GAIT_TRIP:
+      self.tripod_gait()
+    elif self.gait == self.GAIT_WAVE:
+      self.wave_gait()
+    elif self.gait == self.GAIT_RIPP:
+      self.ripple_gait()
+    elif self.gait == self.GAIT_TETR:
+      self.tetrapod_gait()
+
+  def compute_amplitudes(self, leg_num: int):
+    self.amplitudeX, self.amplitudeY, self.amplitudeZ = self.amplitudes[leg_num]
+
+
+  #***********************************************************************
+  # Tripod Gait
+  # Group of 3 legs move forward while the other 3 legs provide support
+  #***********************************************************************
+  def tripod_gait(self):
+    #read commanded values from controller
+    val_x = self.controller.analog(self.THROTTLE_R) - self.controller.analog(self.THROTTLE_L)
+    commandedY = map(val_x, -255, 255, 127, -127)
+    
+    commandedX = map(self.controller.analog(self.AS_RY),0,255,127,-127) 
+    commandedR = map(self.controller.analog(self.AS_RX),0,255,127,-127)
+      
+    #if commands more than deadband then process
+    if abs(commandedX) > 15 or abs(commandedY) > 15 or abs(commandedR) > 15 or self.tick>0:
+      self.compute_strides(commandedX, commandedY, commandedR)
+      numTicks = round(self.duration / self.SERVO_TIME_MS / 2.0) #total ticks divided into the two cases
+      swing_cos, swing_sin = swing_phase(numTicks, self.tick)
+      for leg_num in range(0,6):
+        self.compute_amplitudes(leg_num)
+        if self.tripod_case[leg_num] == 1:                               #move foot forward (raise and lower)
+          self.current_X[leg_num] = self.HOME_X[leg_num] - self.amplitudeX*swing_cos
+          self.current_Y[leg_num] = self.HOME_Y[leg_num] - self.amplitudeY*swing_cos
+          self.current_Z[leg_num] = self.HOME_Z[leg_num] + abs(self.amplitudeZ)*swing_sin
+          if self.tick >= numTicks-1:
+            self.tripod_case[leg_num] = 2
+        elif self.tripod_case[leg_num] == 2:                               #move foot back (on the ground)
+          self.current_X[leg_num] = self.HOME_X[leg_num] + self.amplitudeX*swing_cos
+          self.current_Y[leg_num] = self.HOME_Y[leg_num] + self.amplitudeY*swing_cos
+          self.current_Z[leg_num] = self.HOME_Z[leg_num]
+          if self.tick >= numTicks-1:
+            self.tripod_case[leg_num] = 1
+      #increment tick
+      if self.tick < numTicks-1:
+        self.tick+=1
+      else: 
+        self.tick = 0
+
+
+  #***********************************************************************
+  # Wave Gait
+  # Legs move forward one at a time while the other 5 legs provide support
+  #***********************************************************************
+  def wave_gait(self):
+    #read commanded values from controller
+    val_x = self.controller.analog(self.THROTTLE_R) - self.controller.analog(self.THROTTLE_L)
+    commandedY = map(val_x, -255, 255, 127, -127)
+    
+    commandedX = map(self.controller.analog(self.AS_RY),0,255,127,-127) 
+    commandedR = map(self.controller.analog(self.AS_RX),0,255,127,-127)
+
+    #if commands more than deadband then process
+    if abs(commandedX) > 15 or abs(commandedY) > 15 or abs(commandedR) > 15 or self.tick>0:
+      self.compute_strides(commandedX, commandedY, commandedR)
+      numTicks = round(self.duration / self.SERVO_TIME_MS / 6.0) #total ticks divided into the six cases
+      swing_cos, swing_sin = swing_phase(numTicks, self.tick)
+      for leg_num in range(0,6):
+        self.compute_amplitudes(leg_num)
+        if self.wave_case[leg_num] == 1:                               #move foot forward (raise and lower)
+          self.current_X[leg_num] = self.HOME_X[leg_num] - self.amplitudeX*swing_cos
+          self.current_Y[leg_num] = self.HOME_Y[leg_num] - self.amplitudeY*swing_cos
+          self.current_Z[leg_num] = self.HOME_Z[leg_num] + abs(self.amplitudeZ)*swing_sin
+          if self.tick >= numTicks-1: 
+            self.wave_case[leg_num] = 6
+        elif self.wave_case[leg_num] == 2:                               #move foot back one-fifth (on the ground)
+          self.current_X[leg_num] = self.current_X[leg_num] - self.amplitudeX/numTicks/2.5
+          self.current_Y[leg_num] = self.current_Y[leg_num] - self.amplitudeY/numTicks/2.5
+          self.current_Z[leg_num] = self.HOME_Z[leg_num]
+          if self.tick >= numTicks-1:
+            self.wave_case[leg_num] = 1
+        elif self.wave_case[leg_num] == 3:                               #move foot back one-fifth (on the ground)
+          self.current_X[leg_num] = self.current_X[leg_num] - self.amplitudeX/numTicks/2.5
+          self.current_Y[leg_num] = self.current_Y[leg_num] - self.amplitudeY/numTicks/2.5
+          self.current_Z[leg_num] = self.HOME_Z[leg_num]
+          if self.tick >= numTicks-1:
+            self.wave_case[leg_num] = 2
+        elif self.wave_case[leg_num] == 4:                               #move foot back one-fifth (on the ground)
+          self.current_X[leg_num] = self.current_X[leg_num] - self.amplitudeX/numTicks/2.5
+          self.current_Y[leg_num] = self.current_Y[leg_num] - self.amplitudeY/numTicks/2.5
+          self.current_Z[leg_num] = self.HOME_Z[leg_num]
+          if self.tick >= numTicks-1:
+            self.wave_case[leg_num] = 3
+        elif self.wave_case[leg_num] == 5:                               #move foot back one-fifth (on the ground)
+          self.current_X[leg_num] = self.current_X[leg_num] - self.amplitudeX/numTicks/2.5
+          self.current_Y[leg_num] = self.current_Y[leg_num] - self.amplitudeY/numTicks/2.5
+          self.current_Z[leg_num] = self.HOME_Z[leg_num]
+          if self.tick >= numTicks-1:
+            self.wave_case[leg_num] = 4
+        elif self.wave_case[leg_num] == 6:                               #move foot back one-fifth (on the ground)
+          self.current_X[leg_num] = self.current_X[leg_num] - self.amplitudeX/numTicks/2.5
+          self.current_Y[leg_num] = self.current_Y[leg_num] - self.amplitudeY/numTicks/2.5
+          self.current_Z[leg_num] = self.HOME_Z[leg_num]
+          if self.tick >= numTicks-1:
+            self.wave_case[leg_num] = 5
+      #increment tick
+      if self.tick < numTicks-1:
+        self.tick+=1
+      else:
+        self.tick = 0
+
+
+  #***********************************************************************
+  # Ripple Gait
+  # Left legs move forward rear-to-front while right also do the same,
+  # but right side is offset so RR starts midway through the LM stroke
+  #***********************************************************************
+  def ripple_gait(self):
+    #read commanded values from controller
+    val_x = self.controller.analog(self.THROTTLE_R) - self.controller.analog(self.THROTTLE_L)
+    commandedY = map(val_x, -255, 255, 127, -127)
+    
+    commandedX = map(self.controller.analog(self.AS_RY),0,255,127,-127) 
+    commandedR = map(self.controller.analog(self.AS_RX),0,255,127,-127)
+
+    #if commands more than deadband then process
+    if abs(commandedX) > 15 or abs(commandedY) > 15 or abs(commandedR) > 15 or self.tick>0:
+      self.compute_strides(commandedX, commandedY, commandedR)
+      numTicks = round(self.duration / self.SERVO_TIME_MS / 6.0) #total ticks divided into the six cases
+      raise_cos, raise_sin = swing_phase(numTicks, self.tick, span=2)
+      lower_cos, lower_sin = swing_phase(numTicks, numTicks+self.tick, span=2)
+      for leg_num in range(0,6):
+        self.compute_amplitudes(leg_num)
+        if self.ripple_case[leg_num] == 1:                               #move foot forward (raise)
+          self.current_X[leg_num] = self.HOME_X[leg_num] - self.amplitudeX*raise_cos
+          self.current_Y[leg_num] = self.HOME_Y[leg_num] - self.amplitudeY*raise_cos
+          self.current_Z[leg_num] = self.HOME_Z[leg_num] + abs(self.amplitudeZ)*raise_sin
+          if self.tick >= numTicks-1:
+            self.ripple_case[leg_num] = 2
+        elif self.ripple_case[leg_num] == 2:                               #move foot forward (lower)
+          self.current_X[leg_num] = self.HOME_X[leg_num] - self.amplitudeX*lower_cos
+          self.current_Y[leg_num] = self.HOME_Y[leg_num] - self.amplitudeY*lower_cos
+          self.current_Z[leg_num] = self.HOME_Z[leg_num] + abs(self.amplitudeZ)*lower_sin
+          if self.tick >= numTicks-1:
+            self.ripple_case[leg_num] = 3
+        elif self.ripple_case[leg_num] == 3:                               #move foot back one-quarter (on the ground)
+          self.current_X[leg_num] = self.current_X[leg_num] - self.amplitudeX/numTicks/2.0
+          self.current_Y[leg_num] = self.current_Y[leg_num] - self.amplitudeY/numTicks/2.0
+          self.current_Z[leg_num] = self.HOME_Z[leg_num]
+          if self.tick >= numTicks-1:
+            self.ripple_case[leg_num] = 4
+        elif self.ripple_case[leg_num] == 4:                               #move foot back one-quarter (on the ground)
+          self.current_X[leg_num] = self.current_X[leg_num] - self.amplitudeX/numTicks/2.0
+          self.current_Y[leg_num] = self.current_Y[leg_num] - self.amplitudeY/numTicks/2.0
+          self.current_Z[leg_num] = self.HOME_Z[leg_num]
+          if self.tick >= numTicks-1:
+            self.ripple_case[leg_num] = 5
+        elif self.ripple_case[leg_num] == 5:                               #move foot back one-quarter (on the ground)
+          self.current_X[leg_num] = self.current_X[leg_num] - self.amplitudeX/numTicks/2.0
+          self.current_Y[leg_num] = self.current_Y[leg_num] - self.amplitudeY/numTicks/2.0
+          self.current_Z[leg_num] = self.HOME_Z[leg_num]
+          if self.tick >= numTicks-1:
+            self.ripple_case[leg_num] = 6
+        elif self.ripple_case[leg_num] == 6:                               #move foot back one-quarter (on the ground)
+          self.current_X[leg_num] = self.current_X[leg_num] - self.amplitudeX/numTicks/2.0
+          self.current_Y[leg_num] = self.current_Y[leg_num] - self.amplitudeY/numTicks/2.0
+          self.current_Z[leg_num] = self.HOME_Z[leg_num]
+          if self.tick >= numTicks-1:
+            self.ripple_case[leg_num] = 1
+
+      #increment tick
+      if self.tick < numTicks-1:
+        self.tick+=1
+      else:
+        self.tick = 0
+
+
+  #***********************************************************************
+  # Tetrapod Gait
+  # Right front and left rear legs move forward together, then right  
+  # rear and left middle, and finally right middle and left front.
+  #***********************************************************************
+  def tetrapod_gait(self):
+    #read commanded values from controller
+    val_x = self.controller.analog(self.THROTTLE_R) - self.controller.analog(self.THROTTLE_L)
+    commandedY = map(val_x, -255, 255, 127, -127)
+    
+    commandedX = map(self.controller.analog(self.AS_RY),0,255,127,-127) 
+    commandedR = map(self.controller.analog(self.AS_RX),0,255,127,-127)
+
+    #if commands more than deadband then process
+    if abs(commandedX) > 15 or abs(commandedY) > 15 or abs(commandedR) > 15 or self.tick>0:
+      self.compute_strides(commandedX, commandedY, commandedR)
+      numTicks = round(self.duration / self.SERVO_TIME_MS / 3.0) #total ticks divided into the three cases
+      swing_cos, swing_sin = swing_phase(numTicks, self.tick)
+      for leg_num in range(0,6):
+        self.compute_amplitudes(leg_num)
+        if self.tetrapod_case[leg_num] == 1:                               #move foot forward (raise and lower)
+          self.current_X[leg_num] = self.HOME_X[leg_num] - self.amplitudeX*swing_cos
+          self.current_Y[leg_num] = self.HOME_Y[leg_num] - self.amplitudeY*swing_cos
+          self.current_Z[leg_num] = self.HOME_Z[leg_num] + abs(self.amplitudeZ)*swing_sin
+          if self.tick >= numTicks-1:
+            self.tetrapod_case[leg_num] = 2
+          break
+        elif self.tetrapod_case[leg_num] == 2:                               #move foot back one-half (on the ground)
+          self.current_X[leg_num] = self.current_X[leg_num] - self.amplitudeX/numTicks
+          self.current_Y[leg_num] = self.current_Y[leg_num] - self.amplitudeY/numTicks
+          self.current_Z[leg_num] = self.HOME_Z[leg_num]
+          if self.tick >= numTicks-1:
+            self.tetrapod_case[leg_num] = 3
+          break
+        elif self.tetrapod_case[leg_num] == 3:                               #move foot back one-half (on the ground)
+          self.current_X[leg_num] = self.current_X[leg_num] - self.amplitudeX/numTicks
+          self.current_Y[leg_num] = self.current_Y[leg_num] - self.amplitudeY/numTicks
+          self.current_Z[leg_num] = self.HOME_Z[leg_num]
+          if self.tick >= numTicks-1:
+            self.tetrapod_case[leg_num] = 1
+      #increment tick
+      if self.tick < numTicks-1:
+        self.tick+=1
+      else:
+        self.tick = 0
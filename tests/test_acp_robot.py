@@ -0,0 +1,68 @@
+#***********************************************************************
+# AcpRobot shutdown
+# Every servo channel is released before the PCA boards are shut down.
+# The I2C board libraries are replaced by fakes that record what the
+# robot does with them; the Thrift controller still has to be installed.
+#***********************************************************************
+import os
+import signal
+import sys
+import types
+
+import pytest
+
+pytest.importorskip("thrift")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG = os.path.join(ROOT, "acp", "golden", "robot_config.json")
+
+
+class FakeChannel:
+    def __init__(self):
+        self.angle = 90
+        self.actuation_range = 180
+        self.released = 0
+
+    def __setattr__(self, name, value):
+        if name == "angle" and value is None:
+            self.released += 1
+        object.__setattr__(self, name, value)
+
+
+class FakePCA:
+    def __init__(self, i2c, address):
+        self.channels = [FakeChannel() for _ in range(16)]
+        self.frequency = 0
+        self.deinits = 0
+
+    def deinit(self):
+        self.deinits += 1
+
+
+@pytest.fixture
+def acp_robot(monkeypatch):
+    monkeypatch.syspath_prepend(ROOT)
+    monkeypatch.setitem(sys.modules, "board", types.SimpleNamespace(SCL=None, SDA=None))
+    monkeypatch.setitem(sys.modules, "busio", types.SimpleNamespace(I2C=lambda scl, sda: object()))
+    adafruit_motor = types.ModuleType("adafruit_motor")
+    adafruit_motor.servo = types.SimpleNamespace(Servo=lambda channel: channel)
+    monkeypatch.setitem(sys.modules, "adafruit_motor", adafruit_motor)
+    monkeypatch.setitem(sys.modules, "adafruit_pca9685", types.SimpleNamespace(PCA9685=FakePCA))
+    monkeypatch.delitem(sys.modules, "acp.acp_robot", raising=False)
+    handlers = {s: signal.getsignal(s) for s in (signal.SIGINT, signal.SIGUSR1)}
+
+    from acp import acp_robot
+    yield acp_robot
+
+    for signum, handler in handlers.items():
+        signal.signal(signum, handler)
+
+
+def test_shutdown_releases_every_servo(acp_robot):
+    robot = acp_robot.AcpRobot(CONFIG, controller=None, debug_led=True)
+    assert len(robot.all_servos) == 20
+
+    robot.release_servos()
+    channels = [servo.channel for servo in robot.all_servos]
+    assert [channel.released for channel in channels] == [1]*20
+    assert robot.pca1.deinits == 1 and robot.pca2.deinits == 1
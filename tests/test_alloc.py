@@ -0,0 +1,16 @@
+#***********************************************************************
+# Steady-state allocations of the control loop
+# The alloc budgets of benchmark.py: no memory retained, no GC runs and
+# a bounded transient peak per frame in every continuous mode.
+#***********************************************************************
+import pytest
+
+import benchmark
+
+
+@pytest.mark.parametrize("name, button", benchmark.ALLOC_SCENARIOS)
+def test_steady_state_allocations(name, button):
+    retained, gc_runs, transient = benchmark.measure_alloc(button, frames=500, warmup=2000)
+    assert retained <= benchmark.ALLOC_TOLERANCE
+    assert gc_runs == 0
+    assert transient <= benchmark.TRANSIENT_TOLERANCE
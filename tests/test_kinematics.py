@@ -0,0 +1,99 @@
+#***********************************************************************
+# IK backend accuracy
+# Every backend against the analytic solver, within the bound its
+# module header documents. Targets are the benchmark workspace sweep
+# (+-60 mm X/Y of home, Z in [-170, 30] mm).
+#***********************************************************************
+import numpy as np
+import pytest
+
+import kinematics
+from hexapod import Hexapod
+from ik_cache import CachedIK
+from ik_fixed import FixedPointIK
+from ik_table import TableIK, measure_error
+from benchmark import workspace_sweep
+
+LENGTHS = (Hexapod.COXA_LENGTH, Hexapod.FEMUR_LENGTH, Hexapod.TIBIA_LENGTH)
+HOME = np.array([Hexapod.HOME_X, Hexapod.HOME_Y, Hexapod.HOME_Z]).T
+CAL = np.zeros((6, 3))
+
+
+def reach_margin(targets: np.ndarray) -> np.ndarray:
+    """Distance (mm) of each target inside the nearer reach limit, negative outside."""
+    coxa, femur, tibia = LENGTHS
+    L0 = np.hypot(targets[..., 0], targets[..., 1]) - coxa
+    L3 = np.hypot(L0, targets[..., 2])
+    return np.minimum(tibia + femur - L3, L3 - (tibia - femur))
+
+
+def servo_commands(joints: np.ndarray) -> np.ndarray:
+    return kinematics.joints_to_servo(joints, CAL).astype(np.int64)
+
+
+@pytest.fixture(scope="module")
+def targets() -> np.ndarray:
+    return workspace_sweep(2000)
+
+
+@pytest.fixture(scope="module")
+def analytic(targets):
+    return kinematics.AnalyticIK(*LENGTHS).solve(targets)
+
+
+def test_analytic_round_trip(targets, analytic):
+    joints, valid = analytic
+    positions = kinematics.solve_positions(joints, *LENGTHS)
+    assert valid.mean() > 0.5
+    np.testing.assert_allclose(positions[valid], targets[valid], rtol=0.0, atol=1e-6)
+
+
+def test_scalar_leg_matches_batched(targets):
+    #Hexapod.legs_IK solves the live frame with the scalar functions
+    cal = np.arange(18, dtype=np.float64).reshape(6, 3) - 9.0
+    clamped_targets, clamped = kinematics.clamp_to_reach(targets, *LENGTHS)
+    joints, valid = kinematics.solve_joints(clamped_targets, *LENGTHS)
+    servo = kinematics.joints_to_servo(joints, cal).astype(np.int64)
+    for frame in range(len(targets)):
+        for leg in range(6):
+            X, Y, Z, leg_clamped = kinematics.clamp_leg(*targets[frame, leg].tolist(), *LENGTHS)
+            assert (X, Y, Z) == tuple(clamped_targets[frame, leg].tolist())
+            assert leg_clamped == clamped[frame, leg]
+            leg_joints = kinematics.solve_leg(X, Y, Z, *LENGTHS)
+            assert (leg_joints is not None) == valid[frame, leg]
+            if leg_joints is not None:
+                angles = kinematics.leg_to_servo(leg, *leg_joints, cal[leg].tolist())
+                assert angles == tuple(servo[frame, leg].tolist())
+
+
+def test_table_within_documented_bound(tmp_path):
+    #ik_table.py: coxa < 0.2, femur < 0.7, tibia < 0.7 servo degrees, 5 mm inside reach
+    table = TableIK(*LENGTHS, cache_dir=str(tmp_path))
+    error = measure_error(table, HOME, CAL)
+    assert np.all(error < [0.2, 0.7, 0.7]), error
+
+
+def test_fixed_point_within_one_degree(targets, analytic):
+    #ik_fixed.py: +-1 servo degree, 1 mm inside reach and 5 mm off the coxa axis
+    joints, valid = FixedPointIK(*LENGTHS).solve(targets)
+    ref_joints, ref_valid = analytic
+    inner = (reach_margin(targets) > 1.0) & (np.hypot(targets[..., 0], targets[..., 1]) > 5.0)
+    assert np.array_equal(valid[inner], ref_valid[inner])
+    error = np.abs(servo_commands(joints) - servo_commands(ref_joints))
+    assert error[inner].max() <= 1
+
+
+def test_cache_solves_at_quantized_target(targets):
+    #hits and misses alike solve the target rounded to the resolution; compared as
+    #positions, -0.0 and 0.0 coordinates put the coxa on either side of atan2's cut
+    resolution = 0.1
+    cached = CachedIK(kinematics.AnalyticIK(*LENGTHS), resolution=resolution, max_size=4096)
+    for _ in range(2):                                      #second pass is all hits
+        joints, valid = cached.solve(targets)
+        ref_joints, ref_valid = kinematics.solve_joints(np.round(targets/resolution)*resolution, *LENGTHS)
+        assert np.array_equal(valid, ref_valid)
+        positions = kinematics.solve_positions(joints, *LENGTHS)
+        ref_positions = kinematics.solve_positions(ref_joints, *LENGTHS)
+        np.testing.assert_allclose(positions[valid], ref_positions[valid], rtol=0.0, atol=1e-9)
+        error = np.linalg.norm(positions - targets, axis=-1)[valid]
+        assert error.max() <= resolution*np.sqrt(3)/2 + 1e-9
@@ -0,0 +1,37 @@
+#***********************************************************************
+# Look-ahead walking pipeline
+# The worker steps its own copy of the gait state, and stick jitter
+# within the deadband must not drop the queued frames.
+#***********************************************************************
+import os
+
+import numpy as np
+
+from hexapod import Hexapod
+from lookahead import LookAhead
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "acp", "golden", "robot_config.json")
+
+
+def test_snapshot_does_not_share_arrays():
+    robot = Hexapod(CONFIG)
+    snapshot = robot.walk_snapshot()
+    for name in ("current", "offset", "servo_angles"):
+        assert not np.shares_memory(getattr(snapshot, name), getattr(robot, name)), name
+
+
+def test_jitter_keeps_queue():
+    robot = Hexapod(CONFIG)
+    lookahead = LookAhead(robot, frames=8)
+    lookahead.consume((100.0, 0.0, 0.0, 0))
+    generation = lookahead.generation
+
+    for jitter in (1.5, -2.0, 3.5, -1.0):
+        lookahead.consume((100.0 + jitter, jitter, -jitter, 0))
+    assert lookahead.generation == generation
+
+    lookahead.consume((100.0 + 2*LookAhead.COMMAND_DEADBAND, 0.0, 0.0, 0))
+    assert lookahead.generation == generation + 1
+
+    lookahead.consume((10.0, 0.0, 0.0, 0))           #inside the walk deadband, stops walking
+    assert lookahead.generation == generation + 2
@@ -0,0 +1,42 @@
+#***********************************************************************
+# Motion clips
+# Clips are compiled ahead of time: at startup, and on the clip worker
+# after a calibration change, never by the control loop.
+#***********************************************************************
+import os
+import time
+
+from hexapod import Hexapod
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "acp", "golden", "robot_config.json")
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_calibration_change_recompiles_on_worker(tmp_path):
+    robot = Hexapod(CONFIG, clip_cache_dir=str(tmp_path))
+    assert robot.clips.clips
+    assert os.listdir(tmp_path)
+
+    robot.set_mode(robot.MODE_CALI)
+    robot.update_cal_array()
+    assert not robot.clips.clips
+    robot.set_mode(0)
+    wait_for(lambda: robot.clips.clips)
+
+
+def test_invalid_speed_is_rejected():
+    robot = Hexapod(CONFIG)
+    for speed in (float("nan"), float("inf"), None, "fast", 0, -1.0):
+        robot.play_clip("stand_up", speed)
+        assert robot.clip is None, speed
+        robot.kinematics_step()
+
+    robot.play_clip("stand_up", 2)
+    assert robot.clip is not None and robot.clip_speed == 2.0
+    robot.kinematics_step()